@@ -1,24 +1,193 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Request, Response, Query, Header
 from dotenv import load_dotenv
+from fastapi.responses import StreamingResponse
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, ASCENDING, IndexModel
+from pymongo.errors import BulkWriteError
+from pymongo import monitoring
 import os
+import sys
+import json
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, Callable, Awaitable
 import uuid
+import bisect
+import heapq
+import asyncio
+import hashlib
+import hmac
+import base64
+import gzip
+import time
+import threading
+import cProfile
+import pstats
+import io
+import random
+import csv
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timezone, timedelta
 
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
+# ============== METRICS ==============
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+
+class _ThreadShards:
+    """One mutable shard per thread, so writers never contend or take a lock.
+
+    Motor runs pymongo (and so the command listener) on executor threads while
+    the HTTP middleware runs on the event loop; each thread only ever touches
+    its own shard. Readers sum all shards when /metrics is scraped.
+    """
+
+    def __init__(self):
+        self._shards: Dict[int, Dict[Tuple[str, ...], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def local(self) -> Dict[Tuple[str, ...], List[float]]:
+        ident = threading.get_ident()
+        shard = self._shards.get(ident)
+        if shard is None:
+            with self._lock:
+                shard = self._shards.setdefault(ident, {})
+        return shard
+
+    def merged(self, width: int) -> Dict[Tuple[str, ...], List[float]]:
+        totals: Dict[Tuple[str, ...], List[float]] = {}
+        for shard in list(self._shards.values()):
+            for labels, values in list(shard.items()):
+                total = totals.setdefault(labels, [0] * width)
+                for k, v in enumerate(values):
+                    total[k] += v
+        return totals
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self._shards = _ThreadShards()
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        shard = self._shards.local()
+        values = shard.get(labels)
+        if values is None:
+            shard[labels] = [amount]
+        else:
+            values[0] += amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, (value,) in sorted(self._shards.merged(1).items()):
+            lines.append(f"{self.name}{_format_labels(self.labels, labels)} {value}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...], buckets: Tuple[float, ...]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        # Per label set: one count per bucket, +Inf, then sum and count
+        self._width = len(buckets) + 3
+        self._shards = _ThreadShards()
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        shard = self._shards.local()
+        values = shard.get(labels)
+        if values is None:
+            values = shard[labels] = [0] * self._width
+        values[bisect.bisect_left(self.buckets, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, values in sorted(self._shards.merged(self._width).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, labels)} {values[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, labels)} {values[-1]}")
+        return lines
+
+http_requests_total = Counter(
+    "visaflow_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "visaflow_http_request_duration_seconds", "HTTP request latency.", ("method", "route"), LATENCY_BUCKETS)
+http_request_size = Histogram(
+    "visaflow_http_request_size_bytes", "HTTP request body size.", ("method", "route"), SIZE_BUCKETS)
+http_response_size = Histogram(
+    "visaflow_http_response_size_bytes", "HTTP response body size.", ("method", "route"), SIZE_BUCKETS)
+mongo_command_duration = Histogram(
+    "visaflow_mongo_command_duration_seconds", "MongoDB command latency.", ("command", "collection"), LATENCY_BUCKETS)
+mongo_slow_commands_total = Counter(
+    "visaflow_mongo_slow_commands_total", "MongoDB commands slower than SLOW_MONGO_COMMAND_MS.", ("command", "collection"))
+mongo_command_failures_total = Counter(
+    "visaflow_mongo_command_failures_total", "Failed MongoDB commands.", ("command", "collection"))
+http_requests_in_flight = 0
+
+SLOW_MONGO_COMMAND_SECONDS = float(os.environ.get('SLOW_MONGO_COMMAND_MS', '100')) / 1000
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command sent by the Motor client, labelled by collection."""
+
+    def __init__(self):
+        self._pending: Dict[Tuple[Any, int], str] = {}
+
+    def started(self, event):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = event.command.get("collection", "")
+        self._pending[(event.connection_id, event.request_id)] = collection
+
+    def succeeded(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        seconds = event.duration_micros / 1e6
+        mongo_command_duration.observe((event.command_name, collection), seconds)
+        if seconds >= SLOW_MONGO_COMMAND_SECONDS:
+            mongo_slow_commands_total.inc((event.command_name, collection))
+            logging.getLogger(__name__).warning(
+                "Slow MongoDB command %s on %s took %.1f ms", event.command_name, collection, seconds * 1000)
+
+    def failed(self, event):
+        collection = self._pending.pop((event.connection_id, event.request_id), "")
+        mongo_command_duration.observe((event.command_name, collection), event.duration_micros / 1e6)
+        mongo_command_failures_total.inc((event.command_name, collection))
+
+mongo_metrics = MongoCommandMetrics()
+
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(mongo_url, event_listeners=[mongo_metrics])
 db = client[os.environ['DB_NAME']]
 
+TRIP_STATUSES = ["active", "completed", "expired"]
+
+async def ensure_indexes():
+    await db.users.create_indexes([IndexModel([("id", ASCENDING)], unique=True)])
+    await db.trips.create_indexes([
+        IndexModel([("id", ASCENDING)], unique=True),
+        IndexModel([("user_id", ASCENDING), ("status", ASCENDING), ("entry_date", ASCENDING), ("id", ASCENDING)]),
+        IndexModel([("status", ASCENDING), ("exit_date", ASCENDING)]),
+    ])
+
 # Create the main app without a prefix
 app = FastAPI()
 
@@ -70,11 +239,31 @@ class TripCreate(BaseModel):
     exit_date: str
     extensions_available: int = 0
 
+class TripBulkCreate(BaseModel):
+    trips: List[TripCreate] = Field(..., max_length=500)
+
+class TripIdsRequest(BaseModel):
+    trip_ids: List[str] = Field(..., max_length=500)
+
 class VisaCheckRequest(BaseModel):
     nationality_code: str
     destination_code: str
     travel_purpose: str = "tourism"  # tourism | business | transit
 
+class VisaBatchCheckRequest(BaseModel):
+    nationality_codes: List[str] = Field(..., min_length=1, max_length=250)
+    destination_codes: Optional[List[str]] = Field(None, max_length=250)  # None = all destinations
+    travel_purpose: str = "tourism"
+
+class ItineraryLeg(BaseModel):
+    destination_code: str
+    entry_date: str
+    exit_date: str
+
+class ItineraryRequest(BaseModel):
+    nationality_code: str
+    legs: List[ItineraryLeg] = Field(..., min_length=1, max_length=20)
+
 class VisaRequirement(BaseModel):
     verdict: str  # visa_free | evisa | visa_on_arrival | embassy_visa
     permitted_days: Optional[int] = None
@@ -84,165 +273,835 @@ class VisaRequirement(BaseModel):
     last_updated: str
     application_link: Optional[str] = None
 
-# ============== VISA REQUIREMENTS DATABASE ==============
-
-VISA_REQUIREMENTS: Dict[str, Dict[str, Any]] = {
-    # US Citizens
-    "US-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months", "Proof of onward travel", "Proof of accommodation"], "last_updated": "2025-01-15"},
-    "US-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay", "Return ticket required"], "last_updated": "2025-01-15"},
-    "US-GB": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "US-FR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    "US-DE": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    "US-IT": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    "US-ES": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    "US-MX": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid 6+ months", "Tourist card (FMM) required"], "last_updated": "2025-01-15"},
-    "US-CA": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "US-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required", "Passport valid 6+ months"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "US-ID": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months", "Entry via designated airports"], "last_updated": "2025-01-15"},
-    "US-VN": {"verdict": "evisa", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "cost_usd": 25, "processing_days": "3-5", "application_link": "https://evisa.xuatnhapcanh.gov.vn", "last_updated": "2025-01-15"},
-    "US-IN": {"verdict": "evisa", "permitted_days": 60, "conditions": ["Passport valid 6+ months", "2 blank pages required"], "cost_usd": 25, "processing_days": "1-3", "application_link": "https://indianvisaonline.gov.in", "last_updated": "2025-01-15"},
-    "US-CN": {"verdict": "embassy_visa", "permitted_days": 30, "conditions": ["Apply at Chinese embassy", "Invitation letter may be required"], "cost_usd": 140, "processing_days": "4-7", "last_updated": "2025-01-15"},
-    "US-RU": {"verdict": "embassy_visa", "permitted_days": 30, "conditions": ["Apply at Russian embassy", "Invitation letter required"], "cost_usd": 160, "processing_days": "5-10", "last_updated": "2025-01-15"},
-    "US-BR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "US-AE": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "US-SG": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "US-KR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["K-ETA required", "Passport valid 6+ months"], "cost_usd": 10, "processing_days": "1", "application_link": "https://www.k-eta.go.kr", "last_updated": "2025-01-15"},
-    "US-PH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months", "Return ticket required"], "last_updated": "2025-01-15"},
-    
-    # UK Citizens
-    "GB-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required", "Passport valid throughout stay"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "GB-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months", "Proof of onward travel"], "last_updated": "2025-01-15"},
-    "GB-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "GB-FR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    "GB-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "GB-MX": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "GB-CA": {"verdict": "evisa", "permitted_days": 180, "conditions": ["eTA required"], "cost_usd": 7, "processing_days": "1", "application_link": "https://www.canada.ca/en/immigration-refugees-citizenship/services/visit-canada/eta.html", "last_updated": "2025-01-15"},
-    "GB-IN": {"verdict": "evisa", "permitted_days": 60, "conditions": ["Passport valid 6+ months"], "cost_usd": 25, "processing_days": "1-3", "application_link": "https://indianvisaonline.gov.in", "last_updated": "2025-01-15"},
-    
-    # Canadian Citizens
-    "CA-US": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Valid passport or enhanced driver's license"], "last_updated": "2025-01-15"},
-    "CA-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "CA-MX": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "CA-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "CA-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "CA-GB": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "CA-FR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Schengen zone - 90 days within 180 days"], "last_updated": "2025-01-15"},
-    
-    # Australian Citizens
-    "AU-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "AU-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "AU-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "AU-ID": {"verdict": "visa_on_arrival", "permitted_days": 30, "conditions": ["Passport valid 6+ months", "Payment at airport"], "cost_usd": 35, "last_updated": "2025-01-15"},
-    "AU-NZ": {"verdict": "visa_free", "permitted_days": 0, "conditions": ["Unlimited stay for Australian citizens"], "last_updated": "2025-01-15"},
-    "AU-GB": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "AU-SG": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    
-    # German Citizens
-    "DE-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "DE-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "DE-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "DE-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "DE-CA": {"verdict": "evisa", "permitted_days": 180, "conditions": ["eTA required"], "cost_usd": 7, "processing_days": "1", "application_link": "https://www.canada.ca/en/immigration-refugees-citizenship/services/visit-canada/eta.html", "last_updated": "2025-01-15"},
-    
-    # Indian Citizens
-    "IN-US": {"verdict": "embassy_visa", "permitted_days": 180, "conditions": ["B1/B2 visa required", "Interview at embassy"], "cost_usd": 185, "processing_days": "5-30", "last_updated": "2025-01-15"},
-    "IN-TH": {"verdict": "visa_on_arrival", "permitted_days": 15, "conditions": ["Passport valid 6+ months", "10,000 THB in cash"], "cost_usd": 60, "last_updated": "2025-01-15"},
-    "IN-GB": {"verdict": "embassy_visa", "permitted_days": 180, "conditions": ["Standard visitor visa", "Apply online"], "cost_usd": 130, "processing_days": "15-20", "last_updated": "2025-01-15"},
-    "IN-SG": {"verdict": "evisa", "permitted_days": 30, "conditions": ["Apply through authorized agent"], "cost_usd": 30, "processing_days": "3-5", "last_updated": "2025-01-15"},
-    "IN-AE": {"verdict": "evisa", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "cost_usd": 90, "processing_days": "3-5", "last_updated": "2025-01-15"},
-    "IN-JP": {"verdict": "embassy_visa", "permitted_days": 15, "conditions": ["Apply at embassy", "Itinerary required"], "cost_usd": 30, "processing_days": "5-7", "last_updated": "2025-01-15"},
-    "IN-AU": {"verdict": "embassy_visa", "permitted_days": 90, "conditions": ["Apply online", "Health requirements may apply"], "cost_usd": 145, "processing_days": "15-30", "last_updated": "2025-01-15"},
-    "IN-ID": {"verdict": "visa_on_arrival", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "cost_usd": 35, "last_updated": "2025-01-15"},
-    
-    # French Citizens
-    "FR-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "FR-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "FR-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "FR-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "FR-CA": {"verdict": "evisa", "permitted_days": 180, "conditions": ["eTA required"], "cost_usd": 7, "processing_days": "1", "last_updated": "2025-01-15"},
-    
-    # Japanese Citizens  
-    "JP-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "JP-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "JP-GB": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "JP-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "application_link": "https://www.eta.homeaffairs.gov.au", "last_updated": "2025-01-15"},
-    "JP-KR": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 3+ months"], "last_updated": "2025-01-15"},
-    "JP-SG": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    
-    # Brazilian Citizens
-    "BR-US": {"verdict": "embassy_visa", "permitted_days": 180, "conditions": ["B1/B2 visa required", "Interview at embassy"], "cost_usd": 185, "processing_days": "5-30", "last_updated": "2025-01-15"},
-    "BR-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "BR-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "BR-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "last_updated": "2025-01-15"},
-    
-    # Chinese Citizens
-    "CN-US": {"verdict": "embassy_visa", "permitted_days": 180, "conditions": ["B1/B2 visa required", "Interview at embassy"], "cost_usd": 185, "processing_days": "5-30", "last_updated": "2025-01-15"},
-    "CN-TH": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "CN-JP": {"verdict": "embassy_visa", "permitted_days": 15, "conditions": ["Apply at embassy", "Financial proof required"], "cost_usd": 30, "processing_days": "5-7", "last_updated": "2025-01-15"},
-    "CN-SG": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "CN-AE": {"verdict": "visa_free", "permitted_days": 30, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    
-    # Korean Citizens
-    "KR-US": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ESTA required"], "cost_usd": 21, "processing_days": "1", "application_link": "https://esta.cbp.dhs.gov", "last_updated": "2025-01-15"},
-    "KR-TH": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid 6+ months"], "last_updated": "2025-01-15"},
-    "KR-JP": {"verdict": "visa_free", "permitted_days": 90, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-    "KR-AU": {"verdict": "evisa", "permitted_days": 90, "conditions": ["ETA required"], "cost_usd": 20, "processing_days": "1-2", "last_updated": "2025-01-15"},
-    "KR-GB": {"verdict": "visa_free", "permitted_days": 180, "conditions": ["Passport valid throughout stay"], "last_updated": "2025-01-15"},
-}
-
-# Countries list for dropdowns
-COUNTRIES = [
-    {"code": "US", "name": "United States"},
-    {"code": "GB", "name": "United Kingdom"},
-    {"code": "CA", "name": "Canada"},
-    {"code": "AU", "name": "Australia"},
-    {"code": "DE", "name": "Germany"},
-    {"code": "FR", "name": "France"},
-    {"code": "IT", "name": "Italy"},
-    {"code": "ES", "name": "Spain"},
-    {"code": "JP", "name": "Japan"},
-    {"code": "KR", "name": "South Korea"},
-    {"code": "CN", "name": "China"},
-    {"code": "IN", "name": "India"},
-    {"code": "TH", "name": "Thailand"},
-    {"code": "ID", "name": "Indonesia"},
-    {"code": "VN", "name": "Vietnam"},
-    {"code": "PH", "name": "Philippines"},
-    {"code": "SG", "name": "Singapore"},
-    {"code": "MY", "name": "Malaysia"},
-    {"code": "MX", "name": "Mexico"},
-    {"code": "BR", "name": "Brazil"},
-    {"code": "AR", "name": "Argentina"},
-    {"code": "AE", "name": "United Arab Emirates"},
-    {"code": "SA", "name": "Saudi Arabia"},
-    {"code": "RU", "name": "Russia"},
-    {"code": "NZ", "name": "New Zealand"},
-    {"code": "ZA", "name": "South Africa"},
-    {"code": "NL", "name": "Netherlands"},
-    {"code": "BE", "name": "Belgium"},
-    {"code": "CH", "name": "Switzerland"},
-    {"code": "AT", "name": "Austria"},
-    {"code": "SE", "name": "Sweden"},
-    {"code": "NO", "name": "Norway"},
-    {"code": "DK", "name": "Denmark"},
-    {"code": "FI", "name": "Finland"},
-    {"code": "IE", "name": "Ireland"},
-    {"code": "PT", "name": "Portugal"},
-    {"code": "GR", "name": "Greece"},
-    {"code": "PL", "name": "Poland"},
-    {"code": "CZ", "name": "Czech Republic"},
-    {"code": "HU", "name": "Hungary"},
-    {"code": "TR", "name": "Turkey"},
-    {"code": "EG", "name": "Egypt"},
-    {"code": "IL", "name": "Israel"},
-    {"code": "NG", "name": "Nigeria"},
-    {"code": "KE", "name": "Kenya"},
-    {"code": "CO", "name": "Colombia"},
-    {"code": "CL", "name": "Chile"},
-    {"code": "PE", "name": "Peru"},
-    {"code": "HK", "name": "Hong Kong"},
-    {"code": "TW", "name": "Taiwan"},
-]
+# ============== REQUIREMENTS MATRIX ==============
+
+def _dumps(obj: Any) -> bytes:
+    return json.dumps(obj, separators=(",", ":")).encode()
+
+def _unknown_requirement(nationality_code: str, destination_code: str, today: str) -> Dict[str, Any]:
+    return {
+        "found": False,
+        "nationality_code": nationality_code,
+        "destination_code": destination_code,
+        "verdict": "unknown",
+        "message": "Visa requirements not found in our database. Please check with the embassy.",
+        "last_updated": today
+    }
+
+class RequirementMatrix:
+    """Dense nationality x destination table compiled once per dataset version.
+
+    Cells hold the full check-requirements response and its JSON encoding, so
+    lookups never build per-pair keys or dicts. Rows (one nationality to every
+    destination) are pre-serialized; rows containing unknown pairs are re-encoded
+    once per day because the fallback response carries today's date.
+    """
+
+    def __init__(self, requirements: Dict[str, Dict[str, Any]], countries: List[Dict[str, str]]):
+        self.codes = [c["code"] for c in countries]
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        size = len(self.codes)
+        self.cells: List[List[Optional[Dict[str, Any]]]] = [[None] * size for _ in range(size)]
+        self.cell_bytes: List[List[Optional[bytes]]] = [[None] * size for _ in range(size)]
+
+        for key, req in requirements.items():
+            nationality_code, destination_code = key.split("-", 1)
+            i = self.index.get(nationality_code)
+            j = self.index.get(destination_code)
+            if i is None or j is None:
+                logging.getLogger(__name__).warning("Skipping requirement %s: country not in dataset", key)
+                continue
+            cell = {"found": True, "nationality_code": nationality_code, "destination_code": destination_code, **req}
+            self.cells[i][j] = cell
+            self.cell_bytes[i][j] = _dumps(cell)
+
+        self._complete_rows = [all(b is not None for b in row) for row in self.cell_bytes]
+        self._row_bytes: List[Optional[bytes]] = [None] * size
+        self._rows_day: Optional[str] = None
+
+    def lookup(self, nationality_code: str, destination_code: str) -> Optional[Dict[str, Any]]:
+        i = self.index.get(nationality_code)
+        j = self.index.get(destination_code)
+        if i is None or j is None:
+            return None
+        return self.cells[i][j]
+
+    def cell_json(self, nationality_code: str, destination_code: str, today: str) -> bytes:
+        i = self.index.get(nationality_code)
+        j = self.index.get(destination_code)
+        if i is not None and j is not None and self.cell_bytes[i][j] is not None:
+            return self.cell_bytes[i][j]
+        return _dumps(_unknown_requirement(nationality_code, destination_code, today))
+
+    def row_json(self, nationality_code: str, today: str) -> bytes:
+        i = self.index.get(nationality_code)
+        if i is None:
+            return b"[" + b",".join(self.cell_json(nationality_code, code, today) for code in self.codes) + b"]"
+        if self._rows_day != today:
+            self._row_bytes = [row if self._complete_rows[k] else None for k, row in enumerate(self._row_bytes)]
+            self._rows_day = today
+        row = self._row_bytes[i]
+        if row is None:
+            row = b"[" + b",".join(self.cell_json(nationality_code, code, today) for code in self.codes) + b"]"
+            self._row_bytes[i] = row
+        return row
+
+# ============== REQUIREMENT SEARCH ==============
+
+UNLIMITED_DAYS = 10 ** 6  # permitted_days of 0 means no limit
+
+def _processing_range(value: Optional[str]) -> Tuple[int, int]:
+    if not value:
+        return (0, 0)
+    low, _, high = value.partition("-")
+    return (int(low), int(high or low))
+
+class RequirementSearchIndex:
+    """Inverted indexes over one nationality's row of the requirement matrix.
+
+    Per nationality: destination sets keyed by verdict, and destinations
+    sorted by permitted days and by cost so range filters are a bisect.
+    Queries intersect the candidate sets and sort the survivors.
+    """
+
+    def __init__(self, matrix: RequirementMatrix, countries: List[Dict[str, str]]):
+        self.matrix = matrix
+        names = [country["name"] for country in countries]
+        # Destination position in country-name order, for sort=name
+        self.name_rank = [0] * len(names)
+        for rank, j in enumerate(sorted(range(len(names)), key=lambda j: (names[j].casefold(), matrix.codes[j]))):
+            self.name_rank[j] = rank
+        self.by_verdict: List[Dict[str, frozenset]] = []
+        self.days_sorted: List[Tuple[List[int], List[int]]] = []
+        self.cost_sorted: List[Tuple[List[float], List[int]]] = []
+        self.processing: List[List[Tuple[int, int]]] = []
+        for row in matrix.cells:
+            verdicts: Dict[str, set] = {}
+            days, costs, processing = [], [], []
+            for j, cell in enumerate(row):
+                if cell is None:
+                    processing.append((0, 0))
+                    continue
+                verdicts.setdefault(cell["verdict"], set()).add(j)
+                days.append((cell.get("permitted_days") or UNLIMITED_DAYS, j))
+                costs.append((cell.get("cost_usd") or 0, j))
+                processing.append(_processing_range(cell.get("processing_days")))
+            days.sort()
+            costs.sort()
+            self.by_verdict.append({v: frozenset(js) for v, js in verdicts.items()})
+            self.days_sorted.append(([d for d, _ in days], [j for _, j in days]))
+            self.cost_sorted.append(([c for c, _ in costs], [j for _, j in costs]))
+            self.processing.append(processing)
+
+    def search(
+        self,
+        nationality_code: str,
+        verdicts: Optional[List[str]] = None,
+        min_days: Optional[int] = None,
+        max_cost: Optional[float] = None,
+        sort: str = "days"
+    ) -> List[int]:
+        i = self.matrix.index.get(nationality_code)
+        if i is None:
+            return []
+        days, by_days = self.days_sorted[i]
+        candidates = set(by_days[bisect.bisect_left(days, min_days):] if min_days is not None else by_days)
+        if verdicts:
+            by_verdict = self.by_verdict[i]
+            candidates &= set().union(*(by_verdict.get(v, frozenset()) for v in verdicts))
+        if max_cost is not None:
+            costs, by_cost = self.cost_sorted[i]
+            candidates &= set(by_cost[:bisect.bisect_right(costs, max_cost)])
+
+        row = self.matrix.cells[i]
+        if sort == "cost":
+            key = lambda j: (row[j].get("cost_usd") or 0, self.matrix.codes[j])
+        elif sort == "name":
+            key = lambda j: self.name_rank[j]
+        else:
+            key = lambda j: (-(row[j].get("permitted_days") or UNLIMITED_DAYS), self.matrix.codes[j])
+        return sorted(candidates, key=key)
+
+# ============== HTTP CACHING ==============
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip variants are always built
+    brotli = None
+
+HTTP_CACHE_CONTROL = f"public, max-age={int(os.environ.get('HTTP_CACHE_MAX_AGE', '3600'))}"
+
+def _accepted_encodings(accept_encoding: str) -> set:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+class EncodedBody:
+    """A JSON body encoded once, with compressed variants and a strong ETag for each."""
+
+    __slots__ = ("etag", "variants")
+
+    def __init__(self, body: bytes):
+        digest = hashlib.blake2b(body, digest_size=12).hexdigest()
+        self.etag = f'"{digest}"'
+        self.variants: Dict[str, Tuple[bytes, str]] = {"identity": (body, self.etag)}
+        compressed = gzip.compress(body, compresslevel=9, mtime=0)
+        if len(compressed) < len(body):
+            self.variants["gzip"] = (compressed, f'"{digest}-gz"')
+        if brotli is not None:
+            compressed = brotli.compress(body)
+            if len(compressed) < len(body):
+                self.variants["br"] = (compressed, f'"{digest}-br"')
+
+    def matches(self, if_none_match: str) -> bool:
+        if if_none_match.strip() == "*":
+            return True
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return any(etag in tags for _, etag in self.variants.values())
+
+    def select(self, accept_encoding: str) -> Tuple[str, bytes, str]:
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return (encoding, *self.variants[encoding])
+        return ("identity", *self.variants["identity"])
+
+def _encoded_response(request: Request, encoded: EncodedBody, headers: Dict[str, str]) -> Response:
+    encoding, body, etag = encoded.select(request.headers.get("accept-encoding", ""))
+    headers = {**headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    if request.method in ("GET", "HEAD"):
+        headers["Cache-Control"] = HTTP_CACHE_CONTROL
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and encoded.matches(if_none_match):
+            return Response(status_code=304, headers=headers)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+# ============== REQUIREMENTS DATASET ==============
+
+REQUIREMENTS_PATH = Path(os.environ.get('REQUIREMENTS_PATH', ROOT_DIR / 'data' / 'visa_requirements.json'))
+
+def _intern(value: Any) -> Any:
+    if isinstance(value, str):
+        return sys.intern(value)
+    if isinstance(value, list):
+        return [_intern(v) for v in value]
+    if isinstance(value, dict):
+        return {sys.intern(k): _intern(v) for k, v in value.items()}
+    return value
+
+class RequirementDataset:
+    """One version of the countries list and visa requirements.
+
+    A dataset is built completely before it is published and is never mutated
+    afterwards; a reload publishes a new instance by swapping a single module
+    reference, so request handlers read it without locks.
+    """
+
+    __slots__ = (
+        "version", "last_updated", "countries", "matrix", "search", "source_stamp", "countries_body", "_requirement_bodies"
+    )
+
+    def __init__(self, raw: Dict[str, Any], source_stamp: Tuple[int, int]):
+        raw = _intern(raw)
+        for key, req in raw["requirements"].items():
+            VisaRequirement(**req)
+        self.version: str = raw["version"]
+        self.last_updated: str = raw["last_updated"]
+        self.countries: List[Dict[str, str]] = [{"code": c["code"], "name": c["name"]} for c in raw["countries"]]
+        self.matrix = RequirementMatrix(raw["requirements"], self.countries)
+        self.search = RequirementSearchIndex(self.matrix, self.countries)
+        self.source_stamp = source_stamp
+        self.countries_body = EncodedBody(_dumps(self.countries))
+        # (nationality, destination) -> (day the body is valid for, or None if always, body)
+        self._requirement_bodies: Dict[Tuple[str, str], Tuple[Optional[str], EncodedBody]] = {}
+
+    def requirement_body(self, nationality_code: str, destination_code: str, today: str) -> EncodedBody:
+        key = (nationality_code, destination_code)
+        cached = self._requirement_bodies.get(key)
+        if cached is not None and cached[0] in (None, today):
+            return cached[1]
+        body = EncodedBody(self.matrix.cell_json(nationality_code, destination_code, today))
+        # Only pairs inside the matrix are memoized; arbitrary codes would grow it unbounded
+        if self.matrix.lookup(nationality_code, destination_code) is not None:
+            self._requirement_bodies[key] = (None, body)
+        elif nationality_code in self.matrix.index and destination_code in self.matrix.index:
+            self._requirement_bodies[key] = (today, body)
+        return body
+
+    def headers(self) -> Dict[str, str]:
+        return {"X-Dataset-Version": self.version, "X-Dataset-Last-Updated": self.last_updated}
+
+def load_requirements_dataset(path: Path) -> RequirementDataset:
+    stat = path.stat()
+    return RequirementDataset(json.loads(path.read_bytes()), (stat.st_mtime_ns, stat.st_size))
+
+_dataset = load_requirements_dataset(REQUIREMENTS_PATH)
+
+def current_dataset() -> RequirementDataset:
+    return _dataset
+
+async def reload_requirements_dataset(force: bool = False) -> bool:
+    global _dataset
+    stat = REQUIREMENTS_PATH.stat()
+    if not force and (stat.st_mtime_ns, stat.st_size) == _dataset.source_stamp:
+        return False
+    dataset = await asyncio.to_thread(load_requirements_dataset, REQUIREMENTS_PATH)
+    _dataset = dataset
+    logger.info("Loaded requirements dataset %s (last updated %s)", dataset.version, dataset.last_updated)
+    return True
+
+async def watch_requirements_dataset(interval_seconds: float):
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await reload_requirements_dataset()
+        except Exception:
+            logger.exception("Failed to reload requirements dataset; keeping version %s", _dataset.version)
+
+# ============== STAY ENGINE ==============
+
+SCHENGEN_COUNTRIES = frozenset({
+    "AT", "BE", "CH", "CZ", "DE", "DK", "ES", "FI", "FR", "GR", "HU", "IT", "NL", "NO", "PL", "PT", "SE",
+})
+ZONE_LIMITS = {"SCHENGEN": 90}
+STAY_WINDOW_DAYS = 180
+
+def _to_ordinal(value: str) -> int:
+    return datetime.fromisoformat(value).date().toordinal()
+
+def _stay_key(country_code: str) -> str:
+    return "SCHENGEN" if country_code in SCHENGEN_COUNTRIES else country_code
+
+class StayIntervals:
+    """Inclusive day intervals for one zone or country, merged and sorted by start.
+
+    `prefix[k]` is the number of stay days in the first k merged intervals, so any
+    window count is two bisects and a subtraction.
+    """
+
+    def __init__(self):
+        self.raw: List[Tuple[int, int, str]] = []
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+        self.prefix: List[int] = [0]
+
+    def add(self, start: int, end: int, trip_id: str):
+        bisect.insort(self.raw, (start, end, trip_id))
+        self._merge()
+
+    def remove(self, trip_id: str):
+        self.raw = [r for r in self.raw if r[2] != trip_id]
+        self._merge()
+
+    def _merge(self):
+        starts, ends, prefix = [], [], [0]
+        for start, end, _ in self.raw:
+            if ends and start <= ends[-1] + 1:
+                if end > ends[-1]:
+                    prefix[-1] += end - ends[-1]
+                    ends[-1] = end
+            else:
+                starts.append(start)
+                ends.append(end)
+                prefix.append(prefix[-1] + end - start + 1)
+        self.starts, self.ends, self.prefix = starts, ends, prefix
+
+    def days_before(self, day: int) -> int:
+        k = bisect.bisect_left(self.starts, day)
+        if k == 0:
+            return 0
+        total = self.prefix[k]
+        if self.ends[k - 1] >= day:
+            total -= self.ends[k - 1] - day + 1
+        return total
+
+    def days_between(self, first: int, last: int) -> int:
+        if last < first:
+            return 0
+        return self.days_before(last + 1) - self.days_before(first)
+
+    def nth_day(self, n: int) -> int:
+        # Ordinal of the n-th stay day (1-based) across all intervals
+        k = bisect.bisect_left(self.prefix, n) - 1
+        return self.starts[k] + (n - self.prefix[k] - 1)
+
+    def stay_on(self, day: int) -> Optional[Tuple[int, int]]:
+        # The merged stay that contains `day`, if any
+        k = bisect.bisect_right(self.starts, day) - 1
+        if k < 0 or self.ends[k] < day:
+            return None
+        return (self.starts[k], self.ends[k])
+
+    def stay_summary(self, on: int, limit: Optional[int]) -> Dict[str, Any]:
+        # For per-entry limits: each stay counts from its own entry, nothing rolls over
+        stay = self.stay_on(on)
+        used = on - stay[0] + 1 if stay else 0
+        return {
+            "limit": limit,
+            "entry_date": datetime.fromordinal(stay[0]).strftime("%Y-%m-%d") if stay else None,
+            "exit_date": datetime.fromordinal(stay[1]).strftime("%Y-%m-%d") if stay else None,
+            "days_used": used,
+            "days_remaining": max(0, limit - used) if limit else None,
+            "exceeds_permitted_days": bool(stay and limit) and stay[1] - stay[0] + 1 > limit,
+        }
+
+    def summary(self, on: int, limit: Optional[int]) -> Dict[str, Any]:
+        window_start = on - STAY_WINDOW_DAYS + 1
+        used = self.days_between(window_start, on)
+        result = {
+            "limit": limit,
+            "window_days": STAY_WINDOW_DAYS,
+            "days_used": used,
+            "days_remaining": None,
+            "earliest_reentry": None,
+        }
+        if not limit:
+            return result
+        result["days_remaining"] = max(0, limit - used)
+
+        # Only past stays count towards re-entry; for t >= on the window
+        # [t - 179, t - 1] loses stay days from the front as t advances.
+        past = self.days_between(window_start, on - 1)
+        reentry = on
+        if past > limit - 1:
+            nth = self.days_before(window_start) + past - (limit - 1)
+            reentry = self.nth_day(nth) + STAY_WINDOW_DAYS
+        result["earliest_reentry"] = datetime.fromordinal(reentry).strftime("%Y-%m-%d")
+        return result
+
+class StayLedger:
+    def __init__(self):
+        self.intervals: Dict[str, StayIntervals] = {}
+        self.trip_keys: Dict[str, str] = {}
+
+    def apply(self, trip: Dict[str, Any]):
+        self.discard(trip["id"])
+        start = _to_ordinal(trip["entry_date"])
+        end = _to_ordinal(trip["exit_date"])
+        if trip.get("status") == "completed" and trip.get("completed_at"):
+            end = min(end, _to_ordinal(trip["completed_at"]))
+        if end < start:
+            return
+        key = _stay_key(trip["country_code"])
+        self.intervals.setdefault(key, StayIntervals()).add(start, end, trip["id"])
+        self.trip_keys[trip["id"]] = key
+
+    def discard(self, trip_id: str):
+        key = self.trip_keys.pop(trip_id, None)
+        if key is None:
+            return
+        intervals = self.intervals[key]
+        intervals.remove(trip_id)
+        if not intervals.raw:
+            del self.intervals[key]
+
+class StayEngine:
+    """Per-user stay ledgers loaded from db.trips and kept current by the trip routes.
+
+    Ledgers expire after `ttl_seconds` so writes made by other processes are
+    picked up, as with ReadCache.
+    """
+
+    def __init__(self, max_users: int = 10000, ttl_seconds: float = 300):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._ledgers: "OrderedDict[str, Tuple[float, StayLedger]]" = OrderedDict()
+        self._loading: Dict[str, int] = {}
+
+    def _cached(self, user_id: str) -> Optional[StayLedger]:
+        entry = self._ledgers.get(user_id)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._ledgers[user_id]
+            return None
+        return entry[1]
+
+    async def ledger(self, user_id: str) -> StayLedger:
+        ledger = self._cached(user_id)
+        if ledger is not None:
+            self._ledgers.move_to_end(user_id)
+            return ledger
+
+        try:
+            while True:
+                version = self._loading.setdefault(user_id, 0)
+                ledger = StayLedger()
+                cursor = db.trips.find(
+                    {"user_id": user_id},
+                    {"_id": 0, "id": 1, "country_code": 1, "entry_date": 1, "exit_date": 1, "status": 1, "completed_at": 1}
+                )
+                async for trip in cursor:
+                    ledger.apply(trip)
+                # A write landed while we were reading; read again rather than miss it
+                if self._loading.get(user_id) == version:
+                    break
+        finally:
+            self._loading.pop(user_id, None)
+
+        self._ledgers[user_id] = (time.monotonic() + self.ttl_seconds, ledger)
+        if len(self._ledgers) > self.max_users:
+            self._ledgers.popitem(last=False)
+        return ledger
+
+    def _touch(self, user_id: str) -> Optional[StayLedger]:
+        if user_id in self._loading:
+            self._loading[user_id] += 1
+        return self._cached(user_id)
+
+    def trip_saved(self, trip: Dict[str, Any]):
+        ledger = self._touch(trip["user_id"])
+        if ledger is not None:
+            ledger.apply(trip)
+
+    def trip_removed(self, user_id: str, trip_id: str):
+        ledger = self._touch(user_id)
+        if ledger is not None:
+            ledger.discard(trip_id)
+
+    def invalidate(self, user_id: str):
+        # For bulk writes: cheaper to reload the ledger once than to merge trip by trip
+        self._touch(user_id)
+        self._ledgers.pop(user_id, None)
+
+    async def summary(self, user_id: str, nationality_code: Optional[str], on: int) -> Dict[str, Any]:
+        ledger = await self.ledger(user_id)
+        matrix = current_dataset().matrix
+        zones = []
+        countries = []
+        for key, intervals in ledger.intervals.items():
+            if key in ZONE_LIMITS:
+                zones.append({"zone": key, **intervals.summary(on, ZONE_LIMITS[key])})
+                continue
+            limit = None
+            req = matrix.lookup(nationality_code, key) if nationality_code else None
+            if req is not None:
+                limit = req.get("permitted_days")
+            countries.append({"country_code": key, **intervals.stay_summary(on, limit)})
+        return {"zones": zones, "countries": countries}
+
+# ============== READ CACHE ==============
+
+class ReadCache:
+    """Bounded LRU cache with a TTL and single-flight loading.
+
+    Concurrent misses for one key share a single loader call. Writers call
+    `set`/`update`/`invalidate`; a load that was in flight when its key was
+    written is returned to its callers but not stored, so it cannot overwrite
+    newer data.
+    Cached values are shared and must be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Keys written while their load was in flight
+        self._stale_loads: set = set()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+
+    def peek(self, key: str) -> Any:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def get(self, key: str, loader: Callable[[], Awaitable[Any]]) -> Any:
+        value = self.peek(key)
+        if value is not None:
+            self.hits += 1
+            return value
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+            try:
+                return await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise
+                # The leading load was cancelled, not this caller: load again
+                return await self.get(key, loader)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # waiters re-raise it; don't log it as unretrieved
+            raise
+        else:
+            if value is not None and key not in self._stale_loads:
+                self._store(key, value)
+            future.set_result(value)
+            return value
+        finally:
+            # A cancelled leader must not leave coalesced waiters hanging
+            if not future.done():
+                future.cancel()
+            del self._inflight[key]
+            self._stale_loads.discard(key)
+
+    def _store(self, key: str, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _written(self, key: str):
+        if key in self._inflight:
+            self._stale_loads.add(key)
+
+    def set(self, key: str, value: Any):
+        self._written(key)
+        self._store(key, value)
+
+    def update(self, key: str, fn: Callable[[Any], Any]):
+        self._written(key)
+        value = self.peek(key)
+        if value is not None:
+            self._store(key, fn(value))
+
+    def invalidate(self, key: str):
+        self._written(key)
+        self._entries.pop(key, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+        }
+
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))
+CACHE_TTL_SECONDS = float(os.environ.get('CACHE_TTL_SECONDS', '300'))
+
+user_cache = ReadCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+active_trips_cache = ReadCache(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+stay_engine = StayEngine(CACHE_MAX_ENTRIES, CACHE_TTL_SECONDS)
+
+async def _cached_user(user_id: str) -> Optional[Dict[str, Any]]:
+    return await user_cache.get(user_id, lambda: db.users.find_one({"id": user_id}, {"_id": 0}))
+
+def _trip_saved(trip: Dict[str, Any]):
+    # Keep the active-trips cache and stay ledger in step with a written trip
+    trip_id = trip["id"]
+    if trip.get("status") == "active":
+        active_trips_cache.update(trip["user_id"], lambda trips: [t for t in trips if t["id"] != trip_id] + [trip])
+    else:
+        active_trips_cache.update(trip["user_id"], lambda trips: [t for t in trips if t["id"] != trip_id])
+    stay_engine.trip_saved(trip)
+    expiry_scheduler.track(trip)
+
+def _trip_removed(user_id: str, trip_id: str):
+    active_trips_cache.update(user_id, lambda trips: [t for t in trips if t["id"] != trip_id])
+    stay_engine.trip_removed(user_id, trip_id)
+    expiry_scheduler.forget(trip_id)
+
+# ============== EXPIRY SCHEDULER ==============
+
+WARNING_DAYS = (7, 3, 1)
+
+class LoggingNotifier:
+    async def send(self, event: Dict[str, Any]):
+        logger.info("Visa expiry warning for user %s: %s expires in %d day(s)",
+                    event["user_id"], event["country"], event["days_left"])
+
+class InMemoryNotifier:
+    def __init__(self):
+        self.events: List[Dict[str, Any]] = []
+
+    async def send(self, event: Dict[str, Any]):
+        self.events.append(event)
+
+class ExpiryScheduler:
+    """Expires active trips and sends 7/3/1-day warnings from a min-heap of deadlines.
+
+    Each tick re-reads the active trips whose exit_date falls before the end of
+    a short horizon, one range query on the (status, exit_date) index, so trips
+    written by other processes are picked up and ones they closed are dropped.
+    Trips written through this process's API join or leave the heap at once via
+    `track`/`forget`; stale heap entries are skipped when popped.
+    """
+
+    def __init__(self, notifier: Any, horizon_days: int = 8, interval_seconds: float = 60, batch_size: int = 500):
+        self.notifier = notifier
+        self.horizon_days = max(horizon_days, max(WARNING_DAYS) + 1)
+        self.interval_seconds = interval_seconds
+        self.batch_size = batch_size
+        self._heap: List[Tuple[int, int, str, int]] = []
+        self._trips: Dict[str, Dict[str, Any]] = {}
+        self._loaded_until: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def _push(self, trip: Dict[str, Any]):
+        exit_day = _to_ordinal(trip["exit_date"])
+        self._trips[trip["id"]] = {
+            "user_id": trip["user_id"],
+            "country": trip.get("country"),
+            "exit_date": trip["exit_date"],
+            "exit_day": exit_day,
+            "warned_days": trip.get("warned_days"),
+        }
+        for days_left in WARNING_DAYS:
+            heapq.heappush(self._heap, (exit_day - days_left, days_left, trip["id"], exit_day))
+        # A trip expires the day after its exit date
+        heapq.heappush(self._heap, (exit_day + 1, 0, trip["id"], exit_day))
+
+    def track(self, trip: Dict[str, Any]):
+        if trip.get("status") != "active":
+            self.forget(trip["id"])
+        elif self._loaded_until is not None and _to_ordinal(trip["exit_date"]) < self._loaded_until:
+            self._push(trip)
+
+    def forget(self, trip_id: str):
+        self._trips.pop(trip_id, None)
+
+    async def _load(self, today: int):
+        until = today + self.horizon_days
+        cursor = db.trips.find(
+            {"status": "active", "exit_date": {"$lt": datetime.fromordinal(until).strftime("%Y-%m-%d")}},
+            {"_id": 0, "id": 1, "user_id": 1, "country": 1, "exit_date": 1, "warned_days": 1}
+        )
+        seen = set()
+        async for trip in cursor:
+            seen.add(trip["id"])
+            tracked = self._trips.get(trip["id"])
+            if tracked is None or tracked["exit_day"] != _to_ordinal(trip["exit_date"]):
+                self._push(trip)
+        # No longer active in the window: completed, deleted or moved elsewhere
+        for trip_id in [trip_id for trip_id in self._trips if trip_id not in seen]:
+            del self._trips[trip_id]
+        self._loaded_until = until
+
+    async def tick(self, today: Optional[int] = None):
+        if today is None:
+            today = datetime.now(timezone.utc).date().toordinal()
+        await self._load(today)
+
+        # Keyed by trip id: a trip tracked twice has duplicate heap entries
+        expired: Dict[str, Dict[str, Any]] = {}
+        warnings: Dict[str, int] = {}
+        while self._heap and self._heap[0][0] <= today:
+            _, days_left, trip_id, exit_day = heapq.heappop(self._heap)
+            trip = self._trips.get(trip_id)
+            if trip is None or trip["exit_day"] != exit_day:
+                continue
+            if days_left == 0:
+                expired[trip_id] = trip
+                warnings.pop(trip_id, None)
+            elif exit_day >= today and (trip["warned_days"] is None or days_left < trip["warned_days"]):
+                # After downtime several warnings may be due; only the most urgent is sent
+                warnings[trip_id] = min(days_left, warnings.get(trip_id, days_left))
+
+        expired_ids = list(expired)
+        for i in range(0, len(expired_ids), self.batch_size):
+            batch = expired_ids[i:i + self.batch_size]
+            await db.trips.update_many({"id": {"$in": batch}, "status": "active"}, {"$set": {"status": "expired"}})
+            for trip_id in batch:
+                self._trips.pop(trip_id, None)
+                active_trips_cache.update(expired[trip_id]["user_id"], lambda trips, trip_id=trip_id: [t for t in trips if t["id"] != trip_id])
+
+        if warnings:
+            await self._notify(warnings)
+
+    async def _notify(self, warnings: Dict[str, int]):
+        trips = {trip_id: self._trips[trip_id] for trip_id in warnings if trip_id in self._trips}
+        user_ids = list({trip["user_id"] for trip in trips.values()})
+        users = await db.users.find(
+            {"id": {"$in": user_ids}, "notifications_enabled": True},
+            {"_id": 0, "id": 1}
+        ).to_list(len(user_ids))
+        enabled = {user["id"] for user in users}
+        sent: Dict[int, List[str]] = defaultdict(list)
+        for trip_id, trip in trips.items():
+            # Forgotten (completed or deleted) while the users were loading
+            if trip_id not in self._trips or trip["user_id"] not in enabled:
+                continue
+            days_left = warnings[trip_id]
+            await self.notifier.send({
+                "type": "visa_expiry_warning",
+                "user_id": trip["user_id"],
+                "trip_id": trip_id,
+                "country": trip["country"],
+                "exit_date": trip["exit_date"],
+                "days_left": days_left,
+            })
+            trip["warned_days"] = days_left
+            sent[days_left].append(trip_id)
+        # Persisted so a restart doesn't resend thresholds already warned about
+        for days_left, trip_ids in sent.items():
+            await db.trips.update_many({"id": {"$in": trip_ids}}, {"$set": {"warned_days": days_left}})
+
+    async def run(self):
+        while True:
+            try:
+                await self.tick()
+            except Exception:
+                logger.exception("Expiry scheduler tick failed")
+            await asyncio.sleep(self.interval_seconds)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+expiry_scheduler = ExpiryScheduler(
+    LoggingNotifier(),
+    interval_seconds=float(os.environ.get('EXPIRY_SCHEDULER_INTERVAL_SECONDS', '60'))
+)
+
+# ============== FAST RESPONSES ==============
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder
+    orjson = None
+
+# Opt-in: serve user/trip documents straight from Mongo instead of
+# re-validating them through response_model. Every document is validated
+# by its model when it is written, so reads only need field projection.
+FAST_RESPONSES = os.environ.get('FAST_RESPONSES', 'false').lower() == 'true'
+
+def _project(doc: Dict[str, Any], model: type) -> Dict[str, Any]:
+    try:
+        return {name: doc[name] for name in model.model_fields}
+    except KeyError:
+        # Written before a field existed; let the model fill in defaults
+        return model(**doc).model_dump()
+
+def _fast_json(content: Any) -> Response:
+    body = orjson.dumps(content) if orjson is not None else _dumps(content)
+    return Response(content=body, media_type="application/json")
 
 # ============== API ROUTES ==============
 
@@ -251,8 +1110,9 @@ async def root():
     return {"message": "VisaFlow API v1.0"}
 
 @api_router.get("/countries")
-async def get_countries():
-    return COUNTRIES
+async def get_countries(request: Request):
+    dataset = current_dataset()
+    return _encoded_response(request, dataset.countries_body, dataset.headers())
 
 # User Settings
 @api_router.post("/users", response_model=UserSettings)
@@ -260,13 +1120,19 @@ async def create_user():
     user = UserSettings()
     doc = user.model_dump()
     await db.users.insert_one(doc)
+    doc.pop("_id", None)
+    user_cache.set(doc["id"], doc)
+    if FAST_RESPONSES:
+        return _fast_json(doc)
     return user
 
 @api_router.get("/users/{user_id}", response_model=UserSettings)
 async def get_user(user_id: str):
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user = await _cached_user(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    if FAST_RESPONSES:
+        return _fast_json(_project(user, UserSettings))
     return user
 
 @api_router.patch("/users/{user_id}", response_model=UserSettings)
@@ -275,22 +1141,28 @@ async def update_user(user_id: str, update: UserSettingsUpdate):
     if not update_data:
         raise HTTPException(status_code=400, detail="No update data provided")
     
-    result = await db.users.update_one({"id": user_id}, {"$set": update_data})
-    if result.matched_count == 0:
+    user = await db.users.find_one_and_update(
+        {"id": user_id},
+        {"$set": update_data},
+        {"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    user = await db.users.find_one({"id": user_id}, {"_id": 0})
+    user_cache.set(user_id, user)
+    if FAST_RESPONSES:
+        return _fast_json(_project(user, UserSettings))
     return user
 
 # Trips
-@api_router.post("/trips", response_model=Trip)
-async def create_trip(trip_data: TripCreate):
+def _build_trip(trip_data: TripCreate) -> Trip:
     # Calculate total days
     entry = datetime.fromisoformat(trip_data.entry_date)
     exit_date = datetime.fromisoformat(trip_data.exit_date)
     total_days = (exit_date - entry).days
     
-    trip = Trip(
+    return Trip(
         user_id=trip_data.user_id,
         country=trip_data.country,
         country_code=trip_data.country_code,
@@ -300,54 +1172,643 @@ async def create_trip(trip_data: TripCreate):
         total_days=total_days,
         extensions_available=trip_data.extensions_available
     )
-    
+
+@api_router.post("/trips", response_model=Trip)
+async def create_trip(trip_data: TripCreate):
+    trip = _build_trip(trip_data)
     doc = trip.model_dump()
     await db.trips.insert_one(doc)
+    doc.pop("_id", None)
+    _trip_saved(doc)
+    if FAST_RESPONSES:
+        return _fast_json(doc)
     return trip
 
+async def _active_trips(user_id: str) -> List[Dict[str, Any]]:
+    # Every active trip: a truncated list would read as the user's full itinerary
+    return await active_trips_cache.get(
+        user_id,
+        lambda: db.trips.find({"user_id": user_id, "status": "active"}, {"_id": 0}).to_list(None)
+    )
+
 @api_router.get("/trips/{user_id}", response_model=List[Trip])
 async def get_user_trips(user_id: str):
-    trips = await db.trips.find({"user_id": user_id, "status": "active"}, {"_id": 0}).to_list(100)
+    trips = await _active_trips(user_id)
+    if FAST_RESPONSES:
+        return _fast_json([_project(trip, Trip) for trip in trips])
     return trips
 
+def _encode_trip_cursor(trip: Dict[str, Any]) -> str:
+    return base64.urlsafe_b64encode(_dumps([trip["entry_date"], trip["id"]])).decode()
+
+def _decode_trip_cursor(cursor: str) -> Tuple[str, str]:
+    try:
+        entry_date, trip_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    # The values go into the keyset clause; anything but strings could be a query operator
+    if not isinstance(entry_date, str) or not isinstance(trip_id, str):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return entry_date, trip_id
+
+def _trip_history_query(
+    user_id: str,
+    status: Optional[str],
+    start: Optional[str],
+    end: Optional[str],
+    after: Optional[Tuple[str, str]]
+) -> Dict[str, Any]:
+    if status is not None and status not in TRIP_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    # Keyset pagination over the (user_id, status, entry_date, id) index
+    clauses: List[Dict[str, Any]] = [
+        {"user_id": user_id},
+        {"status": status if status is not None else {"$in": TRIP_STATUSES}},
+    ]
+    if end is not None:
+        clauses.append({"entry_date": {"$lte": end}})
+    if start is not None:
+        clauses.append({"exit_date": {"$gte": start}})
+    if after is not None:
+        entry_date, trip_id = after
+        clauses.append({"$or": [
+            {"entry_date": {"$gt": entry_date}},
+            {"entry_date": entry_date, "id": {"$gt": trip_id}},
+        ]})
+    return {"$and": clauses}
+
+@api_router.get("/users/{user_id}/trips")
+async def list_user_trips(
+    user_id: str,
+    status: Optional[str] = None,
+    start: Optional[str] = None,
+    end: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=200)
+):
+    after = _decode_trip_cursor(cursor) if cursor is not None else None
+    query = _trip_history_query(user_id, status, start, end, after)
+    page = db.trips.find(query, {"_id": 0}).sort([("entry_date", ASCENDING), ("id", ASCENDING)])
+    trips = await page.limit(limit + 1).to_list(limit + 1)
+
+    next_cursor = None
+    if len(trips) > limit:
+        trips = trips[:limit]
+        next_cursor = _encode_trip_cursor(trips[-1])
+    return _fast_json({"trips": [_project(trip, Trip) for trip in trips], "next_cursor": next_cursor})
+
+# Travel history export / import
+EXPORT_BATCH_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+IMPORT_MAX_LINE_BYTES = 64 * 1024
+IMPORT_MAX_ERRORS = 100
+EXPORT_FIELDS = list(Trip.model_fields) + ["completed_at"]
+# Both formats carry the public schema only, never internal fields such as warned_days
+EXPORT_PROJECTION = {"_id": 0, **{field: 1 for field in EXPORT_FIELDS}}
+
+async def _trip_history_batches(user_id: str, status: Optional[str], after: Optional[Tuple[str, str]]):
+    # Each batch is its own keyset query, so memory stays at one batch and
+    # no server-side cursor has to outlive a slow client.
+    while True:
+        query = _trip_history_query(user_id, status, None, None, after)
+        page = db.trips.find(query, EXPORT_PROJECTION).sort([("entry_date", ASCENDING), ("id", ASCENDING)])
+        batch = await page.limit(EXPORT_BATCH_SIZE).to_list(EXPORT_BATCH_SIZE)
+        if not batch:
+            return
+        yield batch
+        if len(batch) < EXPORT_BATCH_SIZE:
+            return
+        after = (batch[-1]["entry_date"], batch[-1]["id"])
+
+async def _ndjson_lines(batches):
+    async for batch in batches:
+        yield b"".join(_dumps(trip) + b"\n" for trip in batch)
+
+async def _csv_lines(batches):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+    writer.writeheader()
+    async for batch in batches:
+        writer.writerows(batch)
+        yield out.getvalue().encode()
+        out.seek(0)
+        out.truncate()
+    if out.tell():
+        yield out.getvalue().encode()
+
+@api_router.get("/users/{user_id}/trips/export")
+async def export_user_trips(
+    user_id: str,
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    after_id: Optional[str] = None
+):
+    # Resume from a pagination cursor, or from the id of the last trip received
+    after = _decode_trip_cursor(cursor) if cursor is not None else None
+    if after_id is not None:
+        last = await db.trips.find_one({"id": after_id, "user_id": user_id}, {"_id": 0, "entry_date": 1, "id": 1})
+        if not last:
+            raise HTTPException(status_code=400, detail="Unknown after_id")
+        after = (last["entry_date"], last["id"])
+    if status is not None and status not in TRIP_STATUSES:
+        raise HTTPException(status_code=400, detail="Invalid status")
+
+    batches = _trip_history_batches(user_id, status, after)
+    if format == "csv":
+        body, media_type = _csv_lines(batches), "text/csv"
+    else:
+        body, media_type = _ndjson_lines(batches), "application/x-ndjson"
+    return StreamingResponse(body, media_type=media_type, headers={
+        "Content-Disposition": f'attachment; filename="trips-{user_id}.{format}"'
+    })
+
+@api_router.post("/users/{user_id}/trips/import")
+async def import_user_trips(user_id: str, request: Request):
+    imported = 0
+    failed = 0
+    errors: List[Dict[str, Any]] = []
+    batch: List[Dict[str, Any]] = []
+    batch_lines: List[int] = []
+
+    def record_error(line_number: int, detail: str):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_number, "detail": detail})
+
+    async def flush():
+        nonlocal imported
+        docs, lines = batch[:], batch_lines[:]
+        batch.clear()
+        batch_lines.clear()
+        rejected = set()
+        try:
+            await db.trips.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                rejected.add(error["index"])
+                record_error(lines[error["index"]], error.get("errmsg", "Write failed"))
+        imported += len(docs) - len(rejected)
+        for i, doc in enumerate(docs):
+            doc.pop("_id", None)
+            if i not in rejected:
+                expiry_scheduler.track(doc)
+
+    def parse(line: bytes, line_number: int):
+        if not line.strip():
+            return
+        try:
+            raw = json.loads(line)
+            trip_data = TripCreate(**{**raw, "user_id": user_id})
+            doc = _build_trip(trip_data).model_dump()
+        except (ValueError, TypeError) as exc:
+            record_error(line_number, str(exc))
+            return
+        if raw.get("status") in TRIP_STATUSES:
+            doc["status"] = raw["status"]
+        # Keep exported identity and history so a re-import reports duplicates
+        # through the unique id index instead of copying the trips
+        for field in ("id", "created_at", "completed_at"):
+            if isinstance(raw.get(field), str):
+                doc[field] = raw[field]
+        batch.append(doc)
+        batch_lines.append(line_number)
+
+    # Parse the body as it arrives; awaiting each insert_many before reading
+    # further chunks applies backpressure to the client.
+    buffer = b""
+    line_number = 0
+    oversized = None
+    try:
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                line_number += 1
+                parse(line, line_number)
+                if len(batch) >= IMPORT_BATCH_SIZE:
+                    await flush()
+            if len(buffer) > IMPORT_MAX_LINE_BYTES:
+                oversized = f"Line {line_number + 1} exceeds {IMPORT_MAX_LINE_BYTES} bytes"
+                break
+        if buffer and oversized is None:
+            line_number += 1
+            parse(buffer, line_number)
+        if batch:
+            await flush()
+    finally:
+        if imported:
+            active_trips_cache.invalidate(user_id)
+            stay_engine.invalidate(user_id)
+    report = {"imported": imported, "failed": failed, "errors": errors}
+    if oversized is not None:
+        # Lines before the oversized one are already stored; report them
+        return Response(
+            content=_dumps({"detail": oversized, **report}),
+            status_code=413,
+            media_type="application/json"
+        )
+    return report
+
+@api_router.post("/trips/bulk")
+async def create_trips_bulk(request: TripBulkCreate):
+    results: List[Dict[str, Any]] = []
+    docs: List[Dict[str, Any]] = []
+    positions: List[int] = []
+    for index, trip_data in enumerate(request.trips):
+        try:
+            doc = _build_trip(trip_data).model_dump()
+        except (ValueError, TypeError) as exc:
+            results.append({"index": index, "status": "error", "detail": str(exc)})
+            continue
+        results.append({"index": index, "id": doc["id"], "status": "created"})
+        docs.append(doc)
+        positions.append(index)
+
+    failed_docs = set()
+    if docs:
+        try:
+            await db.trips.insert_many(docs, ordered=False)
+        except BulkWriteError as exc:
+            for error in exc.details.get("writeErrors", []):
+                failed_docs.add(error["index"])
+                results[positions[error["index"]]].update(status="error", detail=error.get("errmsg"))
+
+    for i, doc in enumerate(docs):
+        doc.pop("_id", None)
+        if i not in failed_docs:
+            _trip_saved(doc)
+
+    created = sum(1 for r in results if r["status"] == "created")
+    return {"created": created, "failed": len(results) - created, "results": results}
+
+@api_router.post("/trips/bulk/complete")
+async def complete_trips_bulk(request: TripIdsRequest):
+    trip_ids = list(dict.fromkeys(request.trip_ids))
+    await db.trips.update_many(
+        {"id": {"$in": trip_ids}, "status": {"$ne": "completed"}},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    trips = await db.trips.find({"id": {"$in": trip_ids}}, {"_id": 0}).to_list(len(trip_ids))
+
+    completed = set()
+    for trip in trips:
+        if trip.get("status") == "completed":
+            completed.add(trip["id"])
+            _trip_saved(trip)
+    results = [{"id": trip_id, "status": "completed" if trip_id in completed else "not_found"} for trip_id in trip_ids]
+    return {"completed": len(completed), "failed": len(trip_ids) - len(completed), "results": results}
+
+@api_router.post("/trips/bulk/delete")
+async def delete_trips_bulk(request: TripIdsRequest):
+    trip_ids = list(dict.fromkeys(request.trip_ids))
+    owners = await db.trips.find({"id": {"$in": trip_ids}}, {"_id": 0, "id": 1, "user_id": 1}).to_list(len(trip_ids))
+    if owners:
+        await db.trips.delete_many({"id": {"$in": [trip["id"] for trip in owners]}})
+
+    deleted = set()
+    for trip in owners:
+        deleted.add(trip["id"])
+        _trip_removed(trip["user_id"], trip["id"])
+    results = [{"id": trip_id, "status": "deleted" if trip_id in deleted else "not_found"} for trip_id in trip_ids]
+    return {"deleted": len(deleted), "failed": len(trip_ids) - len(deleted), "results": results}
+
 @api_router.delete("/trips/{trip_id}")
 async def delete_trip(trip_id: str):
-    result = await db.trips.delete_one({"id": trip_id})
-    if result.deleted_count == 0:
+    trip = await db.trips.find_one_and_delete({"id": trip_id}, {"_id": 0, "id": 1, "user_id": 1})
+    if not trip:
         raise HTTPException(status_code=404, detail="Trip not found")
+    _trip_removed(trip["user_id"], trip_id)
     return {"message": "Trip deleted successfully"}
 
 @api_router.patch("/trips/{trip_id}/complete")
 async def complete_trip(trip_id: str):
-    result = await db.trips.update_one({"id": trip_id}, {"$set": {"status": "completed"}})
-    if result.matched_count == 0:
-        raise HTTPException(status_code=404, detail="Trip not found")
+    # Only the first completion stamps completed_at; repeats must not move the stay's end
+    trip = await db.trips.find_one_and_update(
+        {"id": trip_id, "status": {"$ne": "completed"}},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}},
+        {"_id": 0},
+        return_document=ReturnDocument.AFTER
+    )
+    if not trip:
+        # Already completed (or missing); resync caches from the stored trip
+        trip = await db.trips.find_one({"id": trip_id}, {"_id": 0})
+        if not trip:
+            raise HTTPException(status_code=404, detail="Trip not found")
+    _trip_saved(trip)
     return {"message": "Trip marked as completed"}
 
+@api_router.get("/cache/stats")
+async def get_cache_stats():
+    return {"users": user_cache.stats(), "active_trips": active_trips_cache.stats()}
+
+# Session bootstrap
+def _section_version(body: bytes) -> str:
+    return hashlib.blake2b(body, digest_size=6).hexdigest()
+
+BOOTSTRAP_TRIPS_LIMIT = 200
+
+@api_router.get("/bootstrap/{user_id}")
+async def bootstrap_session(user_id: str, since: Optional[str] = None):
+    user, trips = await asyncio.gather(_cached_user(user_id), _active_trips(user_id))
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    dataset = current_dataset()
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    nationality_code = user.get("nationality_code")
+    # The first page of active trips, in listing order; the rest are fetched
+    # from /users/{user_id}/trips?status=active with next_cursor
+    trips = sorted(trips, key=lambda trip: (trip["entry_date"], trip["id"]))
+    next_cursor = _encode_trip_cursor(trips[BOOTSTRAP_TRIPS_LIMIT - 1]) if len(trips) > BOOTSTRAP_TRIPS_LIMIT else None
+    sections = {
+        "user": _dumps(_project(user, UserSettings)),
+        "trips": _dumps([_project(trip, Trip) for trip in trips[:BOOTSTRAP_TRIPS_LIMIT]]),
+        "requirements": dataset.matrix.row_json(nationality_code, today) if nationality_code else b"null",
+    }
+
+    # The version token is one short digest per section; a client that sends
+    # back its last token only receives the sections that changed since.
+    versions = {name: _section_version(body) for name, body in sections.items()}
+    if next_cursor is not None:
+        # A change on a later page must still invalidate the client's trips
+        versions["trips"] = _section_version(_dumps([_project(trip, Trip) for trip in trips]))
+    previous = dict(part.split(":", 1) for part in since.split(".") if ":" in part) if since else {}
+    token = ".".join(f"{name}:{version}" for name, version in versions.items())
+
+    parts = [b'"version":' + _dumps(token)]
+    for name, body in sections.items():
+        if previous.get(name) != versions[name]:
+            parts.append(_dumps(name) + b":" + body)
+            if name == "trips":
+                parts.append(b'"next_cursor":' + _dumps(next_cursor))
+    return Response(content=b"{" + b",".join(parts) + b"}", media_type="application/json", headers=dataset.headers())
+
+# Stay accounting
+@api_router.get("/stays/{user_id}")
+async def get_user_stays(user_id: str, on: Optional[str] = None):
+    user = await _cached_user(user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    try:
+        day = _to_ordinal(on) if on else datetime.now(timezone.utc).date().toordinal()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date")
+    summary = await stay_engine.summary(user_id, user.get("nationality_code"), day)
+    return {
+        "user_id": user_id,
+        "date": datetime.fromordinal(day).strftime("%Y-%m-%d"),
+        **summary
+    }
+
 # Visa Requirements Check
+def _requirement_response(http_request: Request, nationality_code: str, destination_code: str) -> Response:
+    dataset = current_dataset()
+    # Unknown combinations get a default response dated today
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    body = dataset.requirement_body(nationality_code, destination_code, today)
+    return _encoded_response(http_request, body, dataset.headers())
+
 @api_router.post("/check-requirements")
-async def check_visa_requirements(request: VisaCheckRequest):
-    key = f"{request.nationality_code}-{request.destination_code}"
-    
-    if key in VISA_REQUIREMENTS:
-        req = VISA_REQUIREMENTS[key]
-        return {
-            "found": True,
-            "nationality_code": request.nationality_code,
-            "destination_code": request.destination_code,
-            **req
-        }
-    else:
-        # Return a default response for unknown combinations
-        return {
-            "found": False,
-            "nationality_code": request.nationality_code,
-            "destination_code": request.destination_code,
-            "verdict": "unknown",
-            "message": "Visa requirements not found in our database. Please check with the embassy.",
-            "last_updated": datetime.now(timezone.utc).strftime("%Y-%m-%d")
+async def check_visa_requirements(request: VisaCheckRequest, http_request: Request):
+    return _requirement_response(http_request, request.nationality_code, request.destination_code)
+
+@api_router.get("/check-requirements")
+async def get_visa_requirements(
+    http_request: Request,
+    nationality_code: str,
+    destination_code: str,
+    travel_purpose: str = "tourism"
+):
+    return _requirement_response(http_request, nationality_code, destination_code)
+
+@api_router.post("/check-requirements/batch")
+async def check_visa_requirements_batch(request: VisaBatchCheckRequest):
+    dataset = current_dataset()
+    matrix = dataset.matrix
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    rows = []
+    for nationality_code in dict.fromkeys(request.nationality_codes):
+        if request.destination_codes is None:
+            row = matrix.row_json(nationality_code, today)
+        else:
+            row = b"[" + b",".join(
+                matrix.cell_json(nationality_code, code, today) for code in request.destination_codes
+            ) + b"]"
+        rows.append(_dumps(nationality_code) + b":" + row)
+    return Response(content=b'{"results":{' + b",".join(rows) + b"}}", media_type="application/json", headers=dataset.headers())
+
+@api_router.get("/requirements/search")
+async def search_requirements(
+    nationality_code: str,
+    verdict: Optional[List[str]] = Query(None),
+    min_days: Optional[int] = Query(None, ge=0),
+    max_cost: Optional[float] = Query(None, ge=0),
+    sort: str = Query("days", pattern="^(days|cost|name)$"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200)
+):
+    dataset = current_dataset()
+    matches = dataset.search.search(nationality_code, verdict, min_days, max_cost, sort)
+    i = dataset.matrix.index.get(nationality_code)
+    page = b",".join(dataset.matrix.cell_bytes[i][j] for j in matches[offset:offset + limit])
+    body = b'{"total":' + _dumps(len(matches)) + b',"offset":' + _dumps(offset) + b',"results":[' + page + b"]}"
+    return Response(content=body, media_type="application/json", headers=dataset.headers())
+
+@api_router.post("/itinerary")
+async def check_itinerary(request: ItineraryRequest):
+    dataset = current_dataset()
+    today = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    zones: Dict[str, StayIntervals] = {}
+    legs = []
+    total_cost = 0.0
+    processing_min = processing_max = 0
+
+    days: List[Tuple[int, int]] = []
+    for index, leg in enumerate(request.legs):
+        try:
+            entry, exit_day = _to_ordinal(leg.entry_date), _to_ordinal(leg.exit_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid date in leg {index}")
+        if exit_day < entry:
+            raise HTTPException(status_code=400, detail=f"Leg {index} exits before it enters")
+        days.append((entry, exit_day))
+        # Every leg is in its zone before any is checked, so legs listed out of
+        # date order still count towards each other's windows
+        key = _stay_key(leg.destination_code)
+        if key in ZONE_LIMITS:
+            zones.setdefault(key, StayIntervals()).add(entry, exit_day, str(index))
+
+    for index, leg in enumerate(request.legs):
+        entry, exit_day = days[index]
+        req = dataset.matrix.lookup(request.nationality_code, leg.destination_code)
+        if req is None:
+            req = _unknown_requirement(request.nationality_code, leg.destination_code, today)
+        stay_days = exit_day - entry + 1  # inclusive, as in the zone check
+        permitted = req.get("permitted_days")
+        result = {
+            "index": index,
+            "entry_date": leg.entry_date,
+            "exit_date": leg.exit_date,
+            "stay_days": stay_days,
+            "exceeds_permitted_days": bool(permitted) and stay_days > permitted,
+            "requirement": req,
         }
 
+        key = _stay_key(leg.destination_code)
+        if key in ZONE_LIMITS:
+            used = zones[key].days_between(exit_day - STAY_WINDOW_DAYS + 1, exit_day)
+            result["zone"] = {"zone": key, "limit": ZONE_LIMITS[key], "days_used": used}
+            result["exceeds_zone_limit"] = used > ZONE_LIMITS[key]
+
+        if req["found"]:
+            total_cost += req.get("cost_usd") or 0
+            low, high = _processing_range(req.get("processing_days"))
+            processing_min += low
+            processing_max += high
+        legs.append(result)
+
+    return Response(content=_dumps({
+        "nationality_code": request.nationality_code,
+        "legs": legs,
+        "total_cost_usd": total_cost,
+        "total_processing_days": {"min": processing_min, "max": processing_max},
+        "flagged_legs": [
+            leg["index"] for leg in legs
+            if leg["exceeds_permitted_days"] or leg.get("exceeds_zone_limit") or not leg["requirement"]["found"]
+        ],
+    }), media_type="application/json", headers=dataset.headers())
+
+# Admin
+@api_router.post("/admin/reload-requirements")
+async def reload_requirements(x_admin_token: Optional[str] = Header(None)):
+    # Disabled unless ADMIN_TOKEN is configured
+    admin_token = os.environ.get('ADMIN_TOKEN')
+    if not admin_token or not hmac.compare_digest((x_admin_token or "").encode(), admin_token.encode()):
+        raise HTTPException(status_code=403, detail="Forbidden")
+    try:
+        reloaded = await reload_requirements_dataset(force=True)
+    except (OSError, ValueError, KeyError) as exc:
+        raise HTTPException(status_code=422, detail=f"Requirements dataset rejected: {exc}")
+    dataset = current_dataset()
+    return {"reloaded": reloaded, "version": dataset.version, "last_updated": dataset.last_updated}
+
+@api_router.get("/metrics")
+async def get_metrics():
+    lines = [
+        "# HELP visaflow_http_requests_in_flight HTTP requests currently being served.",
+        "# TYPE visaflow_http_requests_in_flight gauge",
+        f"visaflow_http_requests_in_flight {http_requests_in_flight}",
+    ]
+    for metric in (
+        http_requests_total, http_request_duration, http_request_size, http_response_size,
+        mongo_command_duration, mongo_slow_commands_total, mongo_command_failures_total,
+    ):
+        lines.extend(metric.render())
+    for name, cache in (("users", user_cache), ("active_trips", active_trips_cache)):
+        for key, value in cache.stats().items():
+            lines.append(f'visaflow_cache_{key}{{cache="{name}"}} {value}')
+    return Response(content="\n".join(lines) + "\n", media_type="text/plain; version=0.0.4")
+
+# ============== REQUEST INSTRUMENTATION ==============
+
+SLOW_REQUEST_SECONDS = float(os.environ.get('SLOW_REQUEST_MS', '500')) / 1000
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+
+# Called as hook(method, route, seconds, profile_text_or_None) for each slow request
+slow_request_hooks: List[Callable[[str, str, float, Optional[str]], None]] = []
+
+class RequestProfiler:
+    """Opt-in cProfile sampling for individual requests.
+
+    A sampled request is profiled while it runs; if it turns out slow the top
+    of the profile is handed to the slow-request hooks. cProfile sees the whole
+    event-loop thread, so only one request is profiled at a time.
+    """
+
+    def __init__(self, sample_rate: float):
+        self.sample_rate = sample_rate
+        self._active = False
+
+    def start(self) -> Optional[cProfile.Profile]:
+        if self._active or self.sample_rate <= 0 or random.random() >= self.sample_rate:
+            return None
+        self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def finish(self, profile: Optional[cProfile.Profile], slow: bool) -> Optional[str]:
+        if profile is None:
+            return None
+        profile.disable()
+        self._active = False
+        if not slow:
+            return None
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(25)
+        return out.getvalue()
+
+request_profiler = RequestProfiler(PROFILE_SAMPLE_RATE)
+
+def _log_slow_request(method: str, route: str, seconds: float, profile: Optional[str]):
+    logger.warning("Slow request %s %s took %.1f ms", method, route, seconds * 1000)
+    if profile:
+        logger.warning("Profile for %s %s:\n%s", method, route, profile)
+
+slow_request_hooks.append(_log_slow_request)
+
+class MetricsMiddleware:
+    """Plain ASGI middleware recording latency, sizes and status per route template."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        global http_requests_in_flight
+        status = 500
+        response_size = 0
+
+        async def send_with_metrics(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        http_requests_in_flight += 1
+        profile = request_profiler.start()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight -= 1
+            method = scope["method"]
+            # Label by route template, never the raw path, to bound cardinality
+            route = scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            labels = (method, route)
+            http_requests_total.inc((method, route, str(status)))
+            http_request_duration.observe(labels, elapsed)
+            http_response_size.observe(labels, response_size)
+            for name, value in scope["headers"]:
+                if name == b"content-length":
+                    http_request_size.observe(labels, int(value))
+                    break
+            slow = elapsed >= SLOW_REQUEST_SECONDS
+            profile_text = request_profiler.finish(profile, slow)
+            if slow:
+                for hook in slow_request_hooks:
+                    hook(method, route, elapsed, profile_text)
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -358,6 +1819,7 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Configure logging
 logging.basicConfig(
@@ -366,6 +1828,17 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def startup_db_client():
+    await ensure_indexes()
+    app.state.requirements_watcher = asyncio.create_task(watch_requirements_dataset(
+        float(os.environ.get('REQUIREMENTS_RELOAD_INTERVAL_SECONDS', '30'))
+    ))
+    if os.environ.get('EXPIRY_SCHEDULER_ENABLED', 'false').lower() == 'true':
+        expiry_scheduler.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await expiry_scheduler.stop()
+    app.state.requirements_watcher.cancel()
     client.close()
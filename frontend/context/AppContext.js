@@ -32,17 +32,23 @@ export const AppProvider = ({ children }) => {
       const storedUserId = await AsyncStorage.getItem('visaflow_user_id');
       
       if (storedUserId) {
-        const response = await fetch(`${API_URL}/users/${storedUserId}`);
+        // User, active trips and requirements arrive in a single round trip
+        const response = await fetch(`${API_URL}/bootstrap/${storedUserId}`);
         if (response.ok) {
-          const userData = await response.json();
-          setUser(userData);
-          
-          // Load trips
-          const tripsResponse = await fetch(`${API_URL}/trips/${storedUserId}`);
-          if (tripsResponse.ok) {
-            const tripsData = await tripsResponse.json();
-            setTrips(tripsData);
+          const { user: userData, trips: tripsData, next_cursor: nextCursor } = await response.json();
+          const allTrips = [...tripsData];
+          // Bootstrap carries the first page of active trips; page through the rest
+          let cursor = nextCursor;
+          while (cursor) {
+            const params = new URLSearchParams({ status: 'active', cursor, limit: '200' });
+            const pageResponse = await fetch(`${API_URL}/users/${storedUserId}/trips?${params}`);
+            if (!pageResponse.ok) break;
+            const page = await pageResponse.json();
+            allTrips.push(...page.trips);
+            cursor = page.next_cursor;
           }
+          setUser(userData);
+          setTrips(allTrips);
           
           if (userData.onboarding_completed) {
             setOnboardingStep(4);
@@ -196,15 +202,13 @@ export const AppProvider = ({ children }) => {
 
   const checkVisaRequirements = async (nationalityCode, destinationCode) => {
     try {
-      const response = await fetch(`${API_URL}/check-requirements`, {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify({
-          nationality_code: nationalityCode,
-          destination_code: destinationCode,
-          travel_purpose: 'tourism',
-        }),
+      // GET so repeat lookups can be served by the HTTP cache
+      const params = new URLSearchParams({
+        nationality_code: nationalityCode,
+        destination_code: destinationCode,
+        travel_purpose: 'tourism',
       });
+      const response = await fetch(`${API_URL}/check-requirements?${params}`);
       
       if (response.ok) {
         return await response.json();
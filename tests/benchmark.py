@@ -0,0 +1,329 @@
+"""Load-test and micro-benchmark harness for the VisaFlow API.
+
+Runs the FastAPI app in-process over httpx's ASGI transport against an
+in-memory MongoDB stand-in (mongomock-motor), replays a seeded, weighted mix
+of API calls at a fixed concurrency and reports throughput and p50/p95/p99
+latency per endpoint. With --baseline, results are compared with a stored
+baseline and the run exits non-zero when an endpoint regresses beyond the
+threshold.
+
+Latencies depend on the machine, so baselines are not committed: record one
+on the machine that will run the comparison (and re-record it after hardware
+or dependency changes), then compare later runs against it.
+
+    python -m tests.benchmark                       # all scenarios, report only
+    python -m tests.benchmark --scenario heavy_travellers --concurrency 32
+    python -m tests.benchmark --update-baseline     # record tests/benchmark_baseline.json
+    python -m tests.benchmark --baseline tests/benchmark_baseline.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "visaflow_benchmark")
+
+import httpx  # noqa: E402
+
+try:
+    from mongomock_motor import AsyncMongoMockClient
+except ImportError:  # pragma: no cover - reported at runtime
+    AsyncMongoMockClient = None
+
+import server  # noqa: E402
+
+# httpx logs every request at INFO, which drowns the report
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+BASELINE_PATH = Path(__file__).resolve().parent / "benchmark_baseline.json"
+
+SCENARIOS: Dict[str, Dict[str, Any]] = {
+    "default": {
+        "users": 200,
+        "trips_per_user": 5,
+        "heavy_users": 0,
+        "heavy_trips": 0,
+        "countries": None,
+        "requests": 2000,
+    },
+    "heavy_travellers": {
+        "users": 50,
+        "trips_per_user": 5,
+        "heavy_users": 5,
+        "heavy_trips": 2000,
+        "countries": None,
+        "requests": 1000,
+    },
+    "large_table": {
+        "users": 100,
+        "trips_per_user": 3,
+        "heavy_users": 0,
+        "heavy_trips": 0,
+        "countries": 250,
+        "requests": 2000,
+    },
+}
+
+# Relative weight of each endpoint in the replayed mix
+MIX = {
+    "create_user": 5,
+    "update_user": 10,
+    "get_user": 25,
+    "create_trip": 15,
+    "get_user_trips": 20,
+    "check_visa_requirements": 25,
+}
+
+
+def _large_dataset(path: Path, size: int, rng: random.Random):
+    codes = [chr(65 + i // 26) + chr(65 + i % 26) for i in range(size)]
+    verdicts = ["visa_free", "evisa", "visa_on_arrival", "embassy_visa"]
+    requirements = {}
+    for nationality in codes:
+        for destination in codes:
+            if nationality == destination:
+                continue
+            verdict = rng.choice(verdicts)
+            req = {
+                "verdict": verdict,
+                "permitted_days": rng.choice([15, 30, 60, 90, 180]),
+                "conditions": ["Passport valid 6+ months"],
+                "last_updated": "2025-01-15",
+            }
+            if verdict != "visa_free":
+                req["cost_usd"] = rng.choice([20, 25, 35, 60, 140])
+                req["processing_days"] = rng.choice(["1", "1-3", "5-10"])
+            requirements[f"{nationality}-{destination}"] = req
+    path.write_text(json.dumps({
+        "version": f"benchmark-{size}",
+        "last_updated": "2025-01-15",
+        "countries": [{"code": code, "name": f"Country {code}"} for code in codes],
+        "requirements": requirements,
+    }))
+
+
+def _trip_payload(rng: random.Random, user_id: str, codes: List[str]) -> Dict[str, Any]:
+    entry = rng.randint(0, 700)
+    length = rng.randint(3, 90)
+    start = 738886 + entry  # 2024-01-01
+    return {
+        "user_id": user_id,
+        "country": "Benchmark",
+        "country_code": rng.choice(codes),
+        "visa_type": "Visa-Free",
+        "entry_date": server.datetime.fromordinal(start).strftime("%Y-%m-%d"),
+        "exit_date": server.datetime.fromordinal(start + length).strftime("%Y-%m-%d"),
+    }
+
+
+async def _seed(config: Dict[str, Any], rng: random.Random, codes: List[str]) -> List[str]:
+    user_ids = []
+    users = []
+    trips = []
+    for i in range(config["users"] + config["heavy_users"]):
+        user = server.UserSettings(nationality_code=rng.choice(codes), onboarding_completed=True).model_dump()
+        users.append(user)
+        user_ids.append(user["id"])
+        count = config["heavy_trips"] if i >= config["users"] else config["trips_per_user"]
+        for _ in range(count):
+            trip = server._build_trip(server.TripCreate(**_trip_payload(rng, user["id"], codes)))
+            trips.append(trip.model_dump())
+    await server.db.users.insert_many(users)
+    if trips:
+        await server.db.trips.insert_many(trips)
+    return user_ids
+
+
+def _plan(config: Dict[str, Any], rng: random.Random, user_ids: List[str], codes: List[str]):
+    names = list(MIX)
+    weights = [MIX[name] for name in names]
+    plan = []
+    for _ in range(config["requests"]):
+        name = rng.choices(names, weights)[0]
+        user_id = rng.choice(user_ids)
+        if name == "create_user":
+            plan.append((name, "POST", "/api/users", None))
+        elif name == "update_user":
+            body = {"first_name": f"User{rng.randint(0, 9999)}", "notifications_enabled": rng.random() < 0.5}
+            plan.append((name, "PATCH", f"/api/users/{user_id}", body))
+        elif name == "get_user":
+            plan.append((name, "GET", f"/api/users/{user_id}", None))
+        elif name == "create_trip":
+            plan.append((name, "POST", "/api/trips", _trip_payload(rng, user_id, codes)))
+        elif name == "get_user_trips":
+            plan.append((name, "GET", f"/api/trips/{user_id}", None))
+        else:
+            body = {"nationality_code": rng.choice(codes), "destination_code": rng.choice(codes)}
+            plan.append((name, "POST", "/api/check-requirements", body))
+    return plan
+
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def run_scenario(name: str, concurrency: int, seed: int) -> Dict[str, Any]:
+    config = SCENARIOS[name]
+    rng = random.Random(seed)
+
+    # Fresh in-memory database and empty in-process caches for every scenario
+    server.db = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    server.user_cache = server.ReadCache(server.CACHE_MAX_ENTRIES, server.CACHE_TTL_SECONDS)
+    server.active_trips_cache = server.ReadCache(server.CACHE_MAX_ENTRIES, server.CACHE_TTL_SECONDS)
+    server.stay_engine = server.StayEngine()
+    await server.ensure_indexes()
+
+    original_dataset = server.current_dataset()
+    try:
+        if config["countries"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = Path(tmp) / "requirements.json"
+                _large_dataset(path, config["countries"], rng)
+                server._dataset = server.load_requirements_dataset(path)
+        codes = list(server.current_dataset().matrix.codes)
+
+        user_ids = await _seed(config, rng, codes)
+        plan = _plan(config, rng, user_ids, codes)
+        latencies: Dict[str, List[float]] = {endpoint: [] for endpoint in MIX}
+        errors: Dict[str, int] = {endpoint: 0 for endpoint in MIX}
+        queue = iter(plan)
+
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            async def worker():
+                for endpoint, method, url, body in queue:
+                    start = time.perf_counter()
+                    response = await http.request(method, url, json=body)
+                    latencies[endpoint].append(time.perf_counter() - start)
+                    if response.status_code >= 400:
+                        errors[endpoint] += 1
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            elapsed = time.perf_counter() - started
+    finally:
+        server._dataset = original_dataset
+
+    endpoints = {}
+    for endpoint, values in latencies.items():
+        values.sort()
+        endpoints[endpoint] = {
+            "requests": len(values),
+            "errors": errors[endpoint],
+            "throughput_rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(_percentile(values, 50) * 1000, 3),
+            "p95_ms": round(_percentile(values, 95) * 1000, 3),
+            "p99_ms": round(_percentile(values, 99) * 1000, 3),
+        }
+    return {
+        "concurrency": concurrency,
+        "requests": len(plan),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(plan) / elapsed, 1),
+        "endpoints": endpoints,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float, min_delta_ms: float) -> List[str]:
+    regressions = []
+    for scenario, result in results.items():
+        base = baseline.get(scenario)
+        if base is None:
+            continue
+        for endpoint, stats in result["endpoints"].items():
+            base_stats = base["endpoints"].get(endpoint)
+            if not base_stats or not base_stats["requests"] or not stats["requests"]:
+                continue
+            # Sub-millisecond jitter is not a regression, whatever its ratio
+            if (stats["p95_ms"] > base_stats["p95_ms"] * (1 + threshold)
+                    and stats["p95_ms"] - base_stats["p95_ms"] > min_delta_ms):
+                regressions.append(
+                    f"{scenario}/{endpoint}: p95 {stats['p95_ms']}ms vs baseline {base_stats['p95_ms']}ms")
+        if result["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            regressions.append(
+                f"{scenario}: throughput {result['throughput_rps']} rps vs baseline {base['throughput_rps']} rps")
+    return regressions
+
+
+def _print_result(scenario: str, result: Dict[str, Any]):
+    print(f"\n{scenario}: {result['requests']} requests, concurrency {result['concurrency']}, "
+          f"{result['throughput_rps']} req/s")
+    print(f"  {'endpoint':<26}{'n':>6}{'err':>5}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for endpoint, stats in result["endpoints"].items():
+        print(f"  {endpoint:<26}{stats['requests']:>6}{stats['errors']:>5}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}")
+
+
+async def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="scenario to run (repeatable; default: all)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, help="override the scenario's request count")
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--baseline", type=Path,
+                        help="compare against this baseline (default: report only)")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="allowed fractional regression before failing (default: 0.25)")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0,
+                        help="ignore p95 regressions smaller than this in absolute terms (default: 1.0)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="run each scenario N times and keep the fastest run (default: 3)")
+    parser.add_argument("--update-baseline", action="store_true",
+                        help=f"merge results into --baseline (default: {BASELINE_PATH.relative_to(ROOT_DIR)})")
+    parser.add_argument("--output", type=Path, help="write results as JSON")
+    args = parser.parse_args(argv)
+
+    if AsyncMongoMockClient is None:
+        print("mongomock-motor is required: pip install mongomock-motor", file=sys.stderr)
+        return 2
+
+    results = {}
+    for scenario in args.scenario or list(SCENARIOS):
+        if args.requests:
+            SCENARIOS[scenario]["requests"] = args.requests
+        runs = [await run_scenario(scenario, args.concurrency, args.seed) for _ in range(max(1, args.repeat))]
+        results[scenario] = max(runs, key=lambda run: run["throughput_rps"])
+        _print_result(scenario, results[scenario])
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+    if args.update_baseline:
+        path = args.baseline or BASELINE_PATH
+        baseline = json.loads(path.read_text()) if path.exists() else {}
+        baseline.update(results)
+        path.write_text(json.dumps(baseline, indent=2) + "\n")
+        print(f"\nBaseline written to {path}")
+        return 0
+
+    if args.baseline is None:
+        return 0
+    if not args.baseline.exists():
+        print(f"\nNo baseline at {args.baseline}; run with --update-baseline to record one", file=sys.stderr)
+        return 2
+    regressions = compare(results, json.loads(args.baseline.read_text()), args.threshold, args.min_delta_ms)
+    if regressions:
+        print("\nRegressions beyond {:.0%}:".format(args.threshold))
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    print(f"\nNo regressions beyond {args.threshold:.0%} of baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
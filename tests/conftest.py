@@ -0,0 +1,32 @@
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "visaflow_test")
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def db(monkeypatch):
+    from mongomock_motor import AsyncMongoMockClient
+
+    database = AsyncMongoMockClient()[os.environ["DB_NAME"]]
+    monkeypatch.setattr(server, "db", database)
+    monkeypatch.setattr(server, "user_cache", server.ReadCache(1000, 300))
+    monkeypatch.setattr(server, "active_trips_cache", server.ReadCache(1000, 300))
+    monkeypatch.setattr(server, "stay_engine", server.StayEngine())
+    monkeypatch.setattr(server, "expiry_scheduler", server.ExpiryScheduler(server.InMemoryNotifier()))
+    return database
+
+
+@pytest.fixture
+def client(db):
+    from fastapi.testclient import TestClient
+
+    with TestClient(server.app) as test_client:
+        yield test_client
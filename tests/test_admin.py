@@ -0,0 +1,13 @@
+def test_reload_refused_without_configured_token(client, monkeypatch):
+    monkeypatch.delenv("ADMIN_TOKEN", raising=False)
+    assert client.post("/api/admin/reload-requirements").status_code == 403
+    assert client.post("/api/admin/reload-requirements", headers={"X-Admin-Token": ""}).status_code == 403
+
+
+def test_reload_requires_matching_token(client, monkeypatch):
+    monkeypatch.setenv("ADMIN_TOKEN", "s3cret")
+    assert client.post("/api/admin/reload-requirements").status_code == 403
+    assert client.post("/api/admin/reload-requirements", headers={"X-Admin-Token": "wrong"}).status_code == 403
+    response = client.post("/api/admin/reload-requirements", headers={"X-Admin-Token": "s3cret"})
+    assert response.status_code == 200
+    assert "version" in response.json()
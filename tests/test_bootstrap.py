@@ -0,0 +1,83 @@
+def _bootstrap(client, user_id, since=None):
+    params = {"since": since} if since else {}
+    response = client.get(f"/api/bootstrap/{user_id}", params=params)
+    assert response.status_code == 200
+    return response.json()
+
+
+def test_first_call_returns_every_section(client):
+    user = client.post("/api/users").json()
+    client.patch(f"/api/users/{user['id']}", json={"nationality_code": "US"})
+    body = _bootstrap(client, user["id"])
+    assert set(body) == {"version", "user", "trips", "next_cursor", "requirements"}
+    assert body["next_cursor"] is None
+    assert body["user"]["nationality_code"] == "US"
+    assert body["trips"] == []
+    assert {cell["nationality_code"] for cell in body["requirements"]} == {"US"}
+
+
+def test_unchanged_sections_are_omitted(client):
+    user_id = client.post("/api/users").json()["id"]
+    version = _bootstrap(client, user_id)["version"]
+    body = _bootstrap(client, user_id, version)
+    assert body == {"version": version}
+
+
+def test_changed_sections_come_back(client):
+    user_id = client.post("/api/users").json()["id"]
+    version = _bootstrap(client, user_id)["version"]
+
+    client.patch(f"/api/users/{user_id}", json={"first_name": "Ana"})
+    body = _bootstrap(client, user_id, version)
+    assert set(body) == {"version", "user"}
+    assert body["user"]["first_name"] == "Ana"
+
+    client.post("/api/trips", json={
+        "user_id": user_id, "country": "Thailand", "country_code": "TH", "visa_type": "Visa-Free",
+        "entry_date": "2099-01-01", "exit_date": "2099-01-10",
+    })
+    body = _bootstrap(client, user_id, body["version"])
+    assert set(body) == {"version", "trips", "next_cursor"}
+    assert len(body["trips"]) == 1
+
+
+def test_trips_beyond_first_page_are_listed(client, monkeypatch):
+    import server
+
+    monkeypatch.setattr(server, "BOOTSTRAP_TRIPS_LIMIT", 3)
+    user_id = client.post("/api/users").json()["id"]
+    created = [
+        client.post("/api/trips", json={
+            "user_id": user_id, "country": "Thailand", "country_code": "TH", "visa_type": "Visa-Free",
+            "entry_date": f"2099-01-0{day}", "exit_date": f"2099-01-0{day + 1}",
+        }).json()["id"]
+        for day in range(1, 8)
+    ]
+    body = _bootstrap(client, user_id)
+    trips = [trip["id"] for trip in body["trips"]]
+    assert len(trips) == 3
+    cursor = body["next_cursor"]
+    while cursor:
+        page = client.get(f"/api/users/{user_id}/trips", params={"status": "active", "cursor": cursor, "limit": 2}).json()
+        trips += [trip["id"] for trip in page["trips"]]
+        cursor = page["next_cursor"]
+    assert trips == created
+
+    # Completing a trip past the first page still changes the trips version
+    version = body["version"]
+    client.patch(f"/api/trips/{created[-1]}/complete")
+    assert "trips" in _bootstrap(client, user_id, version)
+
+
+def test_active_trips_are_not_truncated(client):
+    user_id = client.post("/api/users").json()["id"]
+    for _ in range(120):
+        client.post("/api/trips", json={
+            "user_id": user_id, "country": "Thailand", "country_code": "TH", "visa_type": "Visa-Free",
+            "entry_date": "2099-01-01", "exit_date": "2099-01-02",
+        })
+    assert len(client.get(f"/api/trips/{user_id}").json()) == 120
+
+
+def test_unknown_user(client):
+    assert client.get("/api/bootstrap/missing").status_code == 404
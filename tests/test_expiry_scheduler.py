@@ -0,0 +1,121 @@
+import asyncio
+from datetime import date
+
+import server
+
+TODAY = date(2025, 6, 1).toordinal()
+
+
+def _iso(day):
+    return date.fromordinal(day).isoformat()
+
+
+async def _seed(db, exit_day, trip_id="t1", user_id="u1", notifications=True):
+    await db.users.insert_one({"id": user_id, "notifications_enabled": notifications})
+    trip = {
+        "id": trip_id,
+        "user_id": user_id,
+        "country": "Thailand",
+        "entry_date": _iso(exit_day - 20),
+        "exit_date": _iso(exit_day),
+        "status": "active",
+    }
+    await db.trips.insert_one(dict(trip))
+    return trip
+
+
+def _scheduler():
+    return server.ExpiryScheduler(server.InMemoryNotifier())
+
+
+def test_sends_each_threshold_once(db):
+    scheduler = _scheduler()
+
+    async def scenario():
+        await _seed(db, TODAY + 7)
+        for day in range(TODAY, TODAY + 8):
+            await scheduler.tick(today=day)
+            await scheduler.tick(today=day)
+
+    asyncio.run(scenario())
+    assert [e["days_left"] for e in scheduler.notifier.events] == [7, 3, 1]
+
+
+def test_expires_trip_after_exit_date(db):
+    scheduler = _scheduler()
+
+    async def scenario():
+        trip = await _seed(db, TODAY + 1)
+        await scheduler.tick(today=TODAY)
+        # Tracked twice, so the expiry entry is in the heap twice
+        scheduler.track(trip)
+        await scheduler.tick(today=TODAY + 2)
+        return await db.trips.find_one({"id": "t1"})
+
+    assert asyncio.run(scenario())["status"] == "expired"
+    assert "t1" not in scheduler._trips
+
+
+def test_warnings_survive_restart(db):
+    first = _scheduler()
+    second = _scheduler()
+
+    async def scenario():
+        await _seed(db, TODAY + 3)
+        await first.tick(today=TODAY)
+        await second.tick(today=TODAY)
+        await second.tick(today=TODAY + 2)
+        return await db.trips.find_one({"id": "t1"})
+
+    trip = asyncio.run(scenario())
+    assert [e["days_left"] for e in first.notifier.events] == [3]
+    assert [e["days_left"] for e in second.notifier.events] == [1]
+    assert trip["warned_days"] == 1
+
+
+def test_skips_disabled_and_forgotten_trips(db):
+    scheduler = _scheduler()
+
+    async def scenario():
+        await _seed(db, TODAY + 3, trip_id="quiet", user_id="u1", notifications=False)
+        await _seed(db, TODAY + 3, trip_id="gone", user_id="u2")
+        await scheduler._load(TODAY)
+        await db.trips.update_one({"id": "gone"}, {"$set": {"status": "completed"}})
+        scheduler.forget("gone")
+        await scheduler.tick(today=TODAY)
+        await scheduler._notify({"gone": 3})
+
+    asyncio.run(scenario())
+    assert scheduler.notifier.events == []
+
+
+def test_picks_up_trips_written_elsewhere(db):
+    scheduler = _scheduler()
+
+    async def scenario():
+        await scheduler.tick(today=TODAY)
+        # Inserted by another worker into a range the scheduler has already read
+        await _seed(db, TODAY + 2)
+        for day in range(TODAY + 1, TODAY + 12):
+            await scheduler.tick(today=day)
+        return await db.trips.find_one({"id": "t1"})
+
+    assert asyncio.run(scenario())["status"] == "expired"
+    assert [e["days_left"] for e in scheduler.notifier.events] == [1]
+
+
+def test_drops_trips_closed_elsewhere(db):
+    scheduler = _scheduler()
+
+    async def scenario():
+        await _seed(db, TODAY + 5)
+        await scheduler.tick(today=TODAY)
+        sent = len(scheduler.notifier.events)
+        await db.trips.update_one({"id": "t1"}, {"$set": {"status": "completed"}})
+        for day in range(TODAY + 1, TODAY + 8):
+            await scheduler.tick(today=day)
+        return sent, await db.trips.find_one({"id": "t1"})
+
+    sent, trip = asyncio.run(scenario())
+    assert trip["status"] == "completed"
+    assert len(scheduler.notifier.events) == sent
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+import server
+
+TRIP = {
+    "user_id": "u1",
+    "country": "Thailand",
+    "country_code": "TH",
+    "visa_type": "Visa-Free",
+    "entry_date": "2099-01-01",
+    "exit_date": "2099-01-20",
+}
+
+
+def _both(client, monkeypatch, call):
+    responses = []
+    for fast in (False, True):
+        monkeypatch.setattr(server, "FAST_RESPONSES", fast)
+        response = call()
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("application/json")
+        responses.append(response.json())
+    return responses
+
+
+def _without(doc, *keys):
+    return {k: v for k, v in doc.items() if k not in keys}
+
+
+def test_create_user(client, monkeypatch):
+    slow, fast = _both(client, monkeypatch, lambda: client.post("/api/users"))
+    assert list(slow) == list(fast)
+    assert _without(slow, "id", "trial_start", "created_at") == _without(fast, "id", "trial_start", "created_at")
+
+
+def test_create_trip(client, monkeypatch):
+    slow, fast = _both(client, monkeypatch, lambda: client.post("/api/trips", json=TRIP))
+    assert list(slow) == list(fast)
+    assert _without(slow, "id", "created_at") == _without(fast, "id", "created_at")
+
+
+def test_get_and_update_user(client, monkeypatch):
+    user_id = client.post("/api/users").json()["id"]
+    slow, fast = _both(client, monkeypatch, lambda: client.get(f"/api/users/{user_id}"))
+    assert slow == fast
+    slow, fast = _both(
+        client, monkeypatch,
+        lambda: client.patch(f"/api/users/{user_id}", json={"first_name": "Ana", "nationality_code": "PT"})
+    )
+    assert slow == fast
+    assert fast["first_name"] == "Ana"
+
+
+def test_get_user_trips(client, monkeypatch):
+    client.post("/api/trips", json=TRIP)
+    client.post("/api/trips", json={**TRIP, "country": "Vietnam", "country_code": "VN"})
+    slow, fast = _both(client, monkeypatch, lambda: client.get("/api/trips/u1"))
+    assert slow == fast
+    assert len(fast) == 2
+
+
+@pytest.mark.parametrize("path", ["/api/users/legacy", "/api/trips/legacy"])
+def test_legacy_documents_get_defaults(client, db, monkeypatch, path):
+    # Written before onboarding_completed, subscription_status and extensions_available existed
+    async def seed():
+        await db.users.insert_one({
+            "id": "legacy", "first_name": "Old", "nationality": None, "nationality_code": None,
+            "notifications_enabled": True, "trial_start": "2023-01-01T00:00:00+00:00",
+            "created_at": "2023-01-01T00:00:00+00:00",
+        })
+        await db.trips.insert_one({
+            "id": "old-trip", "user_id": "legacy", "country": "Thailand", "country_code": "TH",
+            "visa_type": "Visa-Free", "entry_date": "2099-01-01", "exit_date": "2099-01-20",
+            "total_days": 19, "status": "active", "created_at": "2023-01-01T00:00:00+00:00",
+        })
+
+    asyncio.run(seed())
+    slow, fast = _both(client, monkeypatch, lambda: client.get(path))
+    assert slow == fast
+    if path.startswith("/api/users"):
+        assert fast["onboarding_completed"] is False
+        assert fast["subscription_status"] == "trial"
+    else:
+        assert fast[0]["extensions_available"] == 0
@@ -0,0 +1,89 @@
+import gzip
+
+import pytest
+
+import server
+
+PARAMS = {"nationality_code": "US", "destination_code": "TH"}
+
+
+def test_matching_etag_returns_304(client):
+    first = client.get("/api/countries")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+    assert first.headers["cache-control"].startswith("public")
+
+    second = client.get("/api/countries", headers={"If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["etag"] == etag
+
+    assert client.get("/api/countries", headers={"If-None-Match": f'"other", W/{etag}'}).status_code == 304
+    assert client.get("/api/countries", headers={"If-None-Match": '"other"'}).status_code == 200
+
+
+def test_get_and_post_lookups_agree(client):
+    get = client.get("/api/check-requirements", params=PARAMS)
+    post = client.post("/api/check-requirements", json=PARAMS)
+    assert get.json() == post.json()
+    assert get.headers["etag"] == post.headers["etag"]
+    assert "cache-control" not in post.headers
+    assert client.get("/api/check-requirements", params=PARAMS,
+                      headers={"If-None-Match": get.headers["etag"]}).status_code == 304
+
+
+def _raw(client, encoding):
+    # TestClient decodes bodies; read the selected encoding from the headers
+    response = client.get("/api/countries", headers={"Accept-Encoding": encoding})
+    assert response.status_code == 200
+    return response
+
+
+def test_gzip_is_selected(client):
+    response = _raw(client, "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].endswith('-gz"')
+    assert response.json() == client.get("/api/countries", headers={"Accept-Encoding": "identity"}).json()
+
+
+@pytest.mark.skipif(server.brotli is None, reason="brotli not installed")
+def test_brotli_is_preferred(client):
+    response = _raw(client, "gzip, br")
+    assert response.headers["content-encoding"] == "br"
+    assert response.headers["etag"].endswith('-br"')
+
+
+def test_q_zero_excludes_encoding(client):
+    response = _raw(client, "br;q=0, gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    response = _raw(client, "gzip;q=0, br; q=0.0")
+    assert "content-encoding" not in response.headers
+
+
+def test_encoded_body_variants():
+    body = server.EncodedBody(b'{"a":"' + b"x" * 500 + b'"}')
+    assert gzip.decompress(body.variants["gzip"][0]) == body.variants["identity"][0]
+    assert body.select("identity")[0] == "identity"
+    assert body.select("*;q=0")[0] == "identity"
+    assert body.matches("*")
+    assert body.matches(body.variants["gzip"][1])
+
+
+def test_unknown_pairs_are_redated_daily():
+    dataset = server.current_dataset()
+    first = dataset.requirement_body("US", "ZZ", "2025-01-01")
+    assert b'"last_updated":"2025-01-01"' in first.variants["identity"][0]
+
+    codes = dataset.matrix.codes
+    unknown = next(
+        (n, d) for n in codes for d in codes if dataset.matrix.lookup(n, d) is None
+    )
+    day_one = dataset.requirement_body(*unknown, "2025-01-01")
+    assert dataset.requirement_body(*unknown, "2025-01-01") is day_one
+    day_two = dataset.requirement_body(*unknown, "2025-01-02")
+    assert b'"last_updated":"2025-01-02"' in day_two.variants["identity"][0]
+    assert day_two.etag != day_one.etag
+
+    known = dataset.requirement_body("US", "TH", "2025-01-01")
+    assert dataset.requirement_body("US", "TH", "2025-01-02") is known
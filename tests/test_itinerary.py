@@ -0,0 +1,31 @@
+def _itinerary(client, *legs):
+    return client.post("/api/itinerary", json={
+        "nationality_code": "US",
+        "legs": [{"destination_code": code, "entry_date": entry, "exit_date": exit_date} for code, entry, exit_date in legs],
+    }).json()
+
+
+def test_stay_days_are_inclusive(client):
+    result = _itinerary(client, ("TH", "2025-01-01", "2025-01-30"), ("TH", "2025-03-01", "2025-03-31"))
+    assert [leg["stay_days"] for leg in result["legs"]] == [30, 31]
+    assert [leg["exceeds_permitted_days"] for leg in result["legs"]] == [False, True]
+    assert result["flagged_legs"] == [1]
+
+
+def test_single_day_leg(client):
+    result = _itinerary(client, ("TH", "2025-01-01", "2025-01-01"))
+    assert result["legs"][0]["stay_days"] == 1
+    assert result["flagged_legs"] == []
+
+
+def test_zone_limit_ignores_leg_order(client):
+    france = ("FR", "2025-01-01", "2025-01-30")
+    germany = ("DE", "2025-03-01", "2025-05-29")
+    in_order = _itinerary(client, france, germany)
+    reversed_order = _itinerary(client, germany, france)
+
+    assert in_order["flagged_legs"] == [1]
+    assert in_order["legs"][1]["zone"]["days_used"] == 120
+    assert reversed_order["flagged_legs"] == [0]
+    assert reversed_order["legs"][0]["zone"]["days_used"] == 120
+    assert reversed_order["legs"][1]["zone"]["days_used"] == 30
@@ -0,0 +1,93 @@
+import threading
+from types import SimpleNamespace
+
+import server
+
+
+def _scrape(client):
+    response = client.get("/api/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def _delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+def test_requests_are_labelled_by_route_template(client):
+    before = _scrape(client)
+    user_id = client.post("/api/users").json()["id"]
+    client.get(f"/api/users/{user_id}")
+    client.get("/api/users/someone-else")
+    client.get("/api/no-such-route")
+    after = _scrape(client)
+
+    route = 'method="GET",route="/api/users/{user_id}"'
+    assert _delta(before, after, f'visaflow_http_requests_total{{{route},status="200"}}') == 1
+    assert _delta(before, after, f'visaflow_http_requests_total{{{route},status="404"}}') == 1
+    assert _delta(before, after, 'visaflow_http_requests_total{method="POST",route="/api/users",status="200"}') == 1
+    assert _delta(before, after, 'visaflow_http_requests_total{method="GET",route="unmatched",status="404"}') == 1
+    assert _delta(before, after, f'visaflow_http_request_duration_seconds_count{{{route}}}') == 2
+    assert _delta(before, after, f'visaflow_http_request_duration_seconds_bucket{{{route},le="+Inf"}}') == 2
+    assert not any(user_id in name for name in after)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = server.Histogram("test_seconds", "Test.", ("route",), (0.01, 0.1, 1.0))
+    for value in (0.005, 0.01, 0.05, 0.5, 3.0):
+        histogram.observe(("/x",), value)
+    thread = threading.Thread(target=histogram.observe, args=(("/x",), 0.2))
+    thread.start()
+    thread.join()
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP test_seconds Test.", "# TYPE test_seconds histogram"]
+    values = dict(line.rsplit(" ", 1) for line in lines[2:])
+    assert values['test_seconds_bucket{route="/x",le="0.01"}'] == "2"
+    assert values['test_seconds_bucket{route="/x",le="0.1"}'] == "3"
+    assert values['test_seconds_bucket{route="/x",le="1.0"}'] == "5"
+    assert values['test_seconds_bucket{route="/x",le="+Inf"}'] == "6"
+    assert values['test_seconds_count{route="/x"}'] == "6"
+    assert abs(float(values['test_seconds_sum{route="/x"}']) - 3.765) < 1e-9
+
+
+def test_mongo_commands_are_timed_by_collection(client, monkeypatch):
+    monkeypatch.setattr(server, "SLOW_MONGO_COMMAND_SECONDS", 0.1)
+    listener = server.MongoCommandMetrics()
+
+    def run(request_id, name, command, micros, ok=True):
+        listener.started(SimpleNamespace(
+            command_name=name, command=command, connection_id=("localhost", 27017), request_id=request_id))
+        event = SimpleNamespace(command_name=name, connection_id=("localhost", 27017), request_id=request_id,
+                                duration_micros=micros)
+        (listener.succeeded if ok else listener.failed)(event)
+
+    before = _scrape(client)
+    run(1, "find", {"find": "metrics_test"}, 2000)
+    run(2, "find", {"find": "metrics_test"}, 250000)
+    run(3, "getMore", {"getMore": 42, "collection": "metrics_test"}, 1000)
+    run(4, "insert", {"insert": "metrics_test"}, 500, ok=False)
+    after = _scrape(client)
+
+    find = 'command="find",collection="metrics_test"'
+    assert _delta(before, after, f"visaflow_mongo_command_duration_seconds_count{{{find}}}") == 2
+    assert _delta(before, after, f'visaflow_mongo_command_duration_seconds_bucket{{{find},le="0.005"}}') == 1
+    assert _delta(before, after, f"visaflow_mongo_slow_commands_total{{{find}}}") == 1
+    assert _delta(before, after,
+                  'visaflow_mongo_command_duration_seconds_count{command="getMore",collection="metrics_test"}') == 1
+    assert _delta(before, after,
+                  'visaflow_mongo_command_failures_total{command="insert",collection="metrics_test"}') == 1
+    assert listener._pending == {}
+
+
+def test_cache_stats_are_exported(client):
+    samples = _scrape(client)
+    assert {'visaflow_cache_hits{cache="users"}', 'visaflow_cache_size{cache="active_trips"}'} <= set(samples)
+    # The scrape itself is in flight
+    assert samples["visaflow_http_requests_in_flight"] == 1
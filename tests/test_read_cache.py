@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+
+import server
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_misses_share_one_load():
+    cache = server.ReadCache(10, 60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {"v": 1}
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get("k", loader) for _ in range(5)))
+
+    results = _run(scenario())
+    assert results == [{"v": 1}] * 5
+    assert len(calls) == 1
+    assert cache.misses == 1
+    assert cache.coalesced == 4
+    assert _run(cache.get("k", loader)) == {"v": 1}
+    assert cache.hits == 1
+
+
+def test_load_started_before_write_is_not_stored():
+    cache = server.ReadCache(10, 60)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "old"
+
+        task = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        cache.invalidate("k")
+        release.set()
+        return await task
+
+    assert _run(scenario()) == "old"
+    assert cache.peek("k") is None
+
+
+def test_write_to_another_key_does_not_block_store():
+    cache = server.ReadCache(10, 60)
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def loader():
+            await release.wait()
+            return "a"
+
+        task = asyncio.create_task(cache.get("userA", loader))
+        await asyncio.sleep(0)
+        cache.set("userB", "b")
+        cache.invalidate("userC")
+        release.set()
+        return await task
+
+    assert _run(scenario()) == "a"
+    assert cache.peek("userA") == "a"
+    assert cache.peek("userB") == "b"
+
+
+def test_evictions_are_counted():
+    cache = server.ReadCache(2, 60)
+    for key in ("a", "b", "c", "d"):
+        cache.set(key, key)
+    assert cache.stats()["size"] == 2
+    assert cache.evictions == 2
+    assert cache.peek("a") is None
+    assert cache.peek("d") == "d"
+
+
+def test_loader_error_reaches_waiters():
+    cache = server.ReadCache(10, 60)
+
+    async def loader():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get("k", loader) for _ in range(3)), return_exceptions=True)
+
+    results = _run(scenario())
+    assert all(isinstance(r, ValueError) for r in results)
+    assert cache._inflight == {}
+
+
+def test_cancelled_leader_does_not_strand_waiters():
+    cache = server.ReadCache(10, 60)
+    calls = []
+
+    async def loader():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "fresh"
+
+    async def scenario():
+        leader = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get("k", loader))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.wait_for(waiter, 1)
+
+    assert _run(scenario()) == "fresh"
+    assert len(calls) == 2
+    assert cache.peek("k") == "fresh"
@@ -0,0 +1,44 @@
+import server
+
+
+def _index():
+    countries = [
+        {"code": "DE", "name": "Germany"},
+        {"code": "AT", "name": "Austria"},
+        {"code": "CH", "name": "Switzerland"},
+        {"code": "US", "name": "United States"},
+    ]
+    requirements = {
+        "US-DE": {"verdict": "visa_free", "permitted_days": 90},
+        "US-AT": {"verdict": "visa_free", "permitted_days": 90},
+        "US-CH": {"verdict": "evisa", "permitted_days": 30, "cost_usd": 20},
+    }
+    matrix = server.RequirementMatrix(requirements, countries)
+    return matrix, server.RequirementSearchIndex(matrix, countries)
+
+
+def _codes(matrix, matches):
+    return [matrix.codes[j] for j in matches]
+
+
+def test_sort_by_name_uses_country_names():
+    matrix, index = _index()
+    assert _codes(matrix, index.search("US", sort="name")) == ["AT", "DE", "CH"]
+
+
+def test_filters_and_other_sorts():
+    matrix, index = _index()
+    assert _codes(matrix, index.search("US")) == ["AT", "DE", "CH"]
+    assert _codes(matrix, index.search("US", sort="cost")) == ["AT", "DE", "CH"]
+    assert _codes(matrix, index.search("US", verdicts=["evisa"])) == ["CH"]
+    assert _codes(matrix, index.search("US", min_days=60, sort="name")) == ["AT", "DE"]
+    assert _codes(matrix, index.search("US", max_cost=10)) == ["AT", "DE"]
+    assert index.search("ZZ") == []
+
+
+def test_search_endpoint_sorts_by_name(client):
+    names = {country["code"]: country["name"] for country in client.get("/api/countries").json()}
+    body = client.get("/api/requirements/search", params={"nationality_code": "US", "sort": "name", "limit": 200}).json()
+    result = [names[cell["destination_code"]] for cell in body["results"]]
+    assert result == sorted(result, key=str.casefold)
+    assert body["total"] == len(result)
@@ -0,0 +1,55 @@
+import server
+
+
+def _single(client, nationality_code, destination_code):
+    return client.get("/api/check-requirements", params={
+        "nationality_code": nationality_code, "destination_code": destination_code
+    }).json()
+
+
+def test_one_to_all_matches_single_lookups(client):
+    codes = [country["code"] for country in client.get("/api/countries").json()]
+    response = client.post("/api/check-requirements/batch", json={"nationality_codes": ["US"]})
+    assert response.status_code == 200
+    row = response.json()["results"]["US"]
+    assert [cell["destination_code"] for cell in row] == codes
+    assert row == [_single(client, "US", code) for code in codes]
+
+
+def test_many_to_many_matches_single_lookups(client):
+    nationalities = ["US", "GB", "US", "ZZ"]
+    destinations = ["TH", "FR", "QQ"]
+    results = client.post("/api/check-requirements/batch", json={
+        "nationality_codes": nationalities, "destination_codes": destinations
+    }).json()["results"]
+    assert list(results) == ["US", "GB", "ZZ"]
+    for nationality_code, row in results.items():
+        assert row == [_single(client, nationality_code, code) for code in destinations]
+
+
+def test_batch_size_is_capped(client):
+    assert client.post("/api/check-requirements/batch", json={"nationality_codes": []}).status_code == 422
+    assert client.post("/api/check-requirements/batch", json={"nationality_codes": ["US"] * 251}).status_code == 422
+    assert client.post("/api/check-requirements/batch", json={
+        "nationality_codes": ["US"], "destination_codes": ["TH"] * 251
+    }).status_code == 422
+    assert client.post("/api/check-requirements/batch", json={"nationality_codes": ["US"] * 250}).status_code == 200
+
+
+def test_rows_with_unknown_pairs_are_redated_daily():
+    countries = [{"code": "AA", "name": "A"}, {"code": "BB", "name": "B"}]
+    requirements = {
+        "AA-AA": {"verdict": "visa_free"}, "AA-BB": {"verdict": "visa_free"},
+        "BB-AA": {"verdict": "evisa"},
+    }
+    matrix = server.RequirementMatrix(requirements, countries)
+
+    complete = matrix.row_json("AA", "2025-01-01")
+    assert matrix.row_json("AA", "2025-01-02") is complete
+
+    first = matrix.row_json("BB", "2025-01-01")
+    assert matrix.row_json("BB", "2025-01-01") is first
+    assert b'"last_updated":"2025-01-01"' in first
+    second = matrix.row_json("BB", "2025-01-02")
+    assert b'"last_updated":"2025-01-02"' in second
+    assert b"2025-01-01" not in second
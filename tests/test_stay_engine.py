@@ -0,0 +1,157 @@
+import random
+from datetime import date
+
+import server
+
+DAY = date(2025, 1, 1).toordinal()
+
+
+def _trip(client, user_id, country_code, entry, exit_date):
+    return client.post("/api/trips", json={
+        "user_id": user_id,
+        "country": country_code,
+        "country_code": country_code,
+        "visa_type": "Visa-Free",
+        "entry_date": entry,
+        "exit_date": exit_date,
+    }).json()
+
+
+def _brute_force(days, on, limit):
+    used = len([d for d in days if on - 179 <= d <= on])
+    past = {d for d in days if d < on}
+    reentry = on
+    while len([d for d in past if reentry - 179 <= d <= reentry - 1]) > limit - 1:
+        reentry += 1
+    return used, reentry
+
+
+def test_days_before_and_merge():
+    intervals = server.StayIntervals()
+    intervals.add(DAY + 10, DAY + 19, "a")
+    intervals.add(DAY + 15, DAY + 24, "b")
+    intervals.add(DAY + 40, DAY + 44, "c")
+    assert intervals.starts == [DAY + 10, DAY + 40]
+    assert intervals.prefix == [0, 15, 20]
+    assert intervals.days_before(DAY + 10) == 0
+    assert intervals.days_before(DAY + 12) == 2
+    assert intervals.days_before(DAY + 30) == 15
+    assert intervals.days_before(DAY + 42) == 17
+    assert intervals.days_between(DAY + 20, DAY + 41) == 7
+    intervals.remove("b")
+    assert intervals.days_before(DAY + 100) == 15
+
+
+def test_nth_day():
+    intervals = server.StayIntervals()
+    intervals.add(DAY, DAY + 4, "a")
+    intervals.add(DAY + 10, DAY + 14, "b")
+    assert intervals.nth_day(1) == DAY
+    assert intervals.nth_day(5) == DAY + 4
+    assert intervals.nth_day(6) == DAY + 10
+    assert intervals.nth_day(10) == DAY + 14
+
+
+def test_summary_at_limit():
+    intervals = server.StayIntervals()
+    intervals.add(DAY, DAY + 89, "a")
+    summary = intervals.summary(DAY + 90, 90)
+    assert summary["days_used"] == 90
+    assert summary["days_remaining"] == 0
+    assert summary["earliest_reentry"] == date.fromordinal(DAY + 180).isoformat()
+
+
+def test_summary_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(200):
+        intervals = server.StayIntervals()
+        days = set()
+        for k in range(rng.randint(1, 8)):
+            start = DAY + rng.randint(0, 400)
+            end = start + rng.randint(0, 60)
+            intervals.add(start, end, str(k))
+            days |= set(range(start, end + 1))
+        on = DAY + rng.randint(0, 500)
+        limit = rng.choice([30, 90])
+        summary = intervals.summary(on, limit)
+        used, reentry = _brute_force(days, on, limit)
+        assert summary["days_used"] == used
+        assert summary["days_remaining"] == max(0, limit - used)
+        assert summary["earliest_reentry"] == date.fromordinal(reentry).isoformat()
+
+
+def test_unlimited_stay_has_no_remaining():
+    intervals = server.StayIntervals()
+    intervals.add(DAY, DAY + 9, "a")
+    summary = intervals.summary(DAY + 9, 0)
+    assert summary["days_used"] == 10
+    assert summary["days_remaining"] is None
+    assert summary["earliest_reentry"] is None
+
+
+def test_stays_endpoint_tracks_writes(client):
+    user = client.post("/api/users").json()
+    client.patch(f"/api/users/{user['id']}", json={"nationality_code": "US"})
+    trip = _trip(client, user["id"], "FR", "2025-01-01", "2025-03-01")
+    _trip(client, user["id"], "TH", "2025-03-02", "2025-03-11")
+
+    stays = client.get(f"/api/stays/{user['id']}", params={"on": "2025-03-20"}).json()
+    assert stays["zones"][0]["zone"] == "SCHENGEN"
+    assert stays["zones"][0]["days_used"] == 60
+    assert stays["countries"][0]["days_used"] == 0
+
+    stays = client.get(f"/api/stays/{user['id']}", params={"on": "2025-03-05"}).json()
+    assert stays["countries"][0]["days_used"] == 4
+    assert stays["countries"][0]["limit"] == 30
+
+    client.delete(f"/api/trips/{trip['id']}")
+    stays = client.get(f"/api/stays/{user['id']}", params={"on": "2025-03-20"}).json()
+    assert stays["zones"] == []
+
+
+def test_per_entry_limit_has_no_rolling_window(client):
+    user = client.post("/api/users").json()
+    client.patch(f"/api/users/{user['id']}", json={"nationality_code": "US"})
+    _trip(client, user["id"], "TH", "2025-01-01", "2025-02-01")
+
+    country = client.get(f"/api/stays/{user['id']}", params={"on": "2025-01-31"}).json()["countries"][0]
+    assert country == {
+        "country_code": "TH",
+        "limit": 30,
+        "entry_date": "2025-01-01",
+        "exit_date": "2025-02-01",
+        "days_used": 31,
+        "days_remaining": 0,
+        "exceeds_permitted_days": True,
+    }
+
+
+def test_repeated_complete_keeps_first_completed_at(client, db):
+    import asyncio
+
+    trip = _trip(client, "u1", "TH", "2020-01-01", "2099-01-01")
+    assert client.patch(f"/api/trips/{trip['id']}/complete").status_code == 200
+    first = asyncio.run(db.trips.find_one({"id": trip["id"]}))["completed_at"]
+    assert client.get("/api/trips/u1").json() == []
+    assert client.patch(f"/api/trips/{trip['id']}/complete").status_code == 200
+    assert asyncio.run(db.trips.find_one({"id": trip["id"]}))["completed_at"] == first
+    assert client.patch("/api/trips/missing/complete").status_code == 404
+
+
+def test_ledger_expires_to_pick_up_other_writers(client, db, monkeypatch):
+    import asyncio
+
+    monkeypatch.setattr(server, "stay_engine", server.StayEngine(ttl_seconds=60))
+    user = client.post("/api/users").json()
+    _trip(client, user["id"], "FR", "2025-01-01", "2025-01-10")
+    assert client.get(f"/api/stays/{user['id']}", params={"on": "2025-01-20"}).json()["zones"][0]["days_used"] == 10
+
+    # Written by another process: invisible until the ledger expires
+    asyncio.run(db.trips.insert_one({
+        "id": "elsewhere", "user_id": user["id"], "country_code": "DE",
+        "entry_date": "2025-01-11", "exit_date": "2025-01-15", "status": "active",
+    }))
+    assert client.get(f"/api/stays/{user['id']}", params={"on": "2025-01-20"}).json()["zones"][0]["days_used"] == 10
+    now = server.time.monotonic()
+    monkeypatch.setattr(server.time, "monotonic", lambda: now + 61)
+    assert client.get(f"/api/stays/{user['id']}", params={"on": "2025-01-20"}).json()["zones"][0]["days_used"] == 15
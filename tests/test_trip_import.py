@@ -0,0 +1,65 @@
+import json
+
+import server
+
+
+def _ndjson(*docs):
+    return b"".join(json.dumps(doc).encode() + b"\n" for doc in docs)
+
+
+def _trip(country_code, entry, exit_date, **extra):
+    return {
+        "country": country_code,
+        "country_code": country_code,
+        "visa_type": "Visa-Free",
+        "entry_date": entry,
+        "exit_date": exit_date,
+        **extra,
+    }
+
+
+def test_reimport_keeps_history_and_reports_duplicates(client):
+    body = _ndjson(
+        _trip("TH", "2024-01-01", "2024-01-20", id="t1", status="completed",
+              created_at="2023-12-01T00:00:00+00:00", completed_at="2024-01-20T10:00:00+00:00"),
+        _trip("VN", "2024-02-01", "2024-02-10", id="t2"),
+    )
+    assert client.post("/api/users/u1/trips/import", content=body).json() == {"imported": 2, "failed": 0, "errors": []}
+
+    exported = [json.loads(line) for line in client.get("/api/users/u1/trips/export").content.splitlines()]
+    assert [trip["id"] for trip in exported] == ["t1", "t2"]
+    assert exported[0]["created_at"] == "2023-12-01T00:00:00+00:00"
+    assert exported[0]["completed_at"] == "2024-01-20T10:00:00+00:00"
+
+    report = client.post("/api/users/u1/trips/import", content=_ndjson(*exported)).json()
+    assert report["imported"] == 0
+    assert report["failed"] == 2
+    assert [error["line"] for error in report["errors"]] == [1, 2]
+    assert len(client.get("/api/users/u1/trips/export").content.splitlines()) == 2
+
+
+def test_oversized_line_returns_partial_report(client):
+    body = (
+        _ndjson(_trip("TH", "2024-01-01", "2024-01-20"), {"country": "bad"})
+        + b"x" * (server.IMPORT_MAX_LINE_BYTES + 1)
+    )
+    response = client.post("/api/users/u1/trips/import", content=body)
+    assert response.status_code == 413
+    report = response.json()
+    assert report["imported"] == 1
+    assert report["failed"] == 1
+    assert report["errors"][0]["line"] == 2
+    assert "Line 3" in report["detail"]
+
+
+def test_export_carries_only_public_fields(client, db):
+    import asyncio
+
+    client.post("/api/users/u1/trips/import", content=_ndjson(_trip("TH", "2024-01-01", "2024-01-20", id="t1")))
+    asyncio.run(db.trips.update_one({"id": "t1"}, {"$set": {"warned_days": 3, "internal": True}}))
+
+    exported = json.loads(client.get("/api/users/u1/trips/export").content)
+    assert set(exported) <= set(server.EXPORT_FIELDS)
+    assert exported["id"] == "t1"
+    header = client.get("/api/users/u1/trips/export", params={"format": "csv"}).text.splitlines()[0]
+    assert header.split(",") == server.EXPORT_FIELDS
@@ -0,0 +1,40 @@
+import base64
+import json
+
+import pytest
+
+
+def _cursor(value):
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+@pytest.mark.parametrize("cursor", [
+    "not-base64!",
+    _cursor({"a": 1}),
+    _cursor(["2025-01-01"]),
+    _cursor([{"$gt": ""}, "x"]),
+    _cursor(["2025-01-01", {"$ne": None}]),
+    _cursor([1, 2]),
+])
+def test_malformed_cursor_is_rejected(client, cursor):
+    assert client.get("/api/users/u1/trips", params={"cursor": cursor}).status_code == 400
+    assert client.get("/api/users/u1/trips/export", params={"cursor": cursor}).status_code == 400
+
+
+def test_pages_follow_cursor(client):
+    ids = [
+        client.post("/api/trips", json={
+            "user_id": "u1", "country": "Thailand", "country_code": "TH", "visa_type": "Visa-Free",
+            "entry_date": f"2024-0{month}-01", "exit_date": f"2024-0{month}-10",
+        }).json()["id"]
+        for month in range(1, 6)
+    ]
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/api/users/u1/trips", params=params).json()
+        seen += [trip["id"] for trip in page["trips"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert seen == ids
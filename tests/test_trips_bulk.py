@@ -0,0 +1,25 @@
+TRIP = {
+    "user_id": "u1",
+    "country": "Thailand",
+    "country_code": "TH",
+    "visa_type": "Visa-Free",
+    "entry_date": "2099-01-01",
+    "exit_date": "2099-01-10",
+}
+
+
+def test_bad_items_fail_alone(client):
+    response = client.post("/api/trips/bulk", json={"trips": [
+        TRIP,
+        {**TRIP, "exit_date": "2099-01-10T00:00:00+00:00"},
+        {**TRIP, "entry_date": "not-a-date"},
+        {**TRIP, "country": "Vietnam", "country_code": "VN"},
+    ]})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert [r["status"] for r in results] == ["created", "error", "error", "created"]
+    assert len(client.get("/api/trips/u1").json()) == 2
+
+
+def test_batch_size_is_capped(client):
+    assert client.post("/api/trips/bulk", json={"trips": [TRIP] * 501}).status_code == 422